@@ -0,0 +1,139 @@
+import os
+import glob
+import json
+import time
+import threading
+
+# Pool of TradingView accounts (one cookie file each), so workers aren't all
+# capped by a single session's rate and concurrency limits.
+# Each driver is bound to one account. Accounts are handed out round-robin
+# (offset by shard) or least-recently-used, page loads are paced per account,
+# and an account is dropped when it's logged out or benched while throttled.
+#   COOKIE_POOL="cookies/*.json"  or  COOKIE_POOL="a.json,b.json"
+
+COOKIE_POOL = os.getenv("COOKIE_POOL", "")
+ACCOUNT_STRATEGY = os.getenv("ACCOUNT_STRATEGY", "lru")                    # "lru" or "round_robin"
+ACCOUNT_MIN_INTERVAL = float(os.getenv("ACCOUNT_MIN_INTERVAL", "0"))       # seconds between page loads per account
+ACCOUNT_COOLDOWN = float(os.getenv("ACCOUNT_COOLDOWN", "600"))             # bench time for a throttled account
+COOKIE_KEYS = ("name", "value", "path", "secure", "expiry")
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def pool_paths(spec, default):
+    paths = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if part:
+            paths.extend(sorted(glob.glob(part)) or ([part] if os.path.exists(part) else []))
+    if not paths and default and os.path.exists(default):
+        paths = [default]
+    return paths
+
+class Account:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.last_used = 0.0
+        self.loads = 0
+        self.benched_until = 0.0
+        self.dropped = None  # reason, once removed from rotation
+
+    def cookies(self):
+        # Re-read every time so a refreshed file is picked up on re-auth
+        with open(self.path, "r", encoding="utf-8") as f:
+            return [{k: v for k, v in c.items() if k in COOKIE_KEYS} for c in json.load(f)]
+
+class AccountPool:
+    def __init__(self, paths, strategy=ACCOUNT_STRATEGY, min_interval=ACCOUNT_MIN_INTERVAL,
+                 cooldown=ACCOUNT_COOLDOWN, offset=0):
+        self.accounts = [Account(p) for p in paths]
+        self.strategy = strategy
+        self.min_interval = min_interval
+        self.cooldown = cooldown
+        self._next = offset % len(self.accounts) if self.accounts else 0
+        self._lock = threading.Lock()  # drivers are also created on the hot-spare thread
+        if len(self.accounts) > 1:
+            log(f"👥 {len(self.accounts)} accounts in rotation ({strategy})")
+
+    def __len__(self):
+        return len(self.active())
+
+    def active(self):
+        return [a for a in self.accounts if not a.dropped]
+
+    def acquire(self):
+        # Next usable account; waits out the shortest bench if every account is throttled
+        while True:
+            with self._lock:
+                live = self.active()
+                if not live:
+                    return None
+                now = time.time()
+                ready = [a for a in live if a.benched_until <= now]
+                if ready:
+                    if self.strategy == "round_robin":
+                        for _ in range(len(self.accounts)):
+                            a = self.accounts[self._next]
+                            self._next = (self._next + 1) % len(self.accounts)
+                            if a in ready:
+                                break
+                    else:
+                        a = min(ready, key=lambda x: x.last_used)
+                    # counts as use for LRU without delaying the account's first page load
+                    a.last_used = max(a.last_used, now - self.min_interval)
+                    return a
+                wait = min(a.benched_until for a in live) - now
+            log(f"⏳ All accounts throttled, waiting {wait:.0f}s")
+            time.sleep(max(wait, 0.1))
+
+    def _own(self, drv):
+        # A browser handed over by an earlier job (runner.py) is bound to that job's pool;
+        # it keeps its session if this pool has the same cookie file, otherwise it's unbound
+        account = getattr(drv, "tv_account", None)
+        if account is not None and account not in self.accounts:
+            account = next((a for a in self.accounts if a.path == account.path), None)
+            drv.tv_account = account
+        return account
+
+    def assign(self, drv):
+        # Keeps the driver's account while it's usable, otherwise binds a new one
+        account = self._own(drv)
+        if account is None or account.dropped or account.benched_until > time.time():
+            account = self.acquire()
+            drv.tv_account = account
+        return account
+
+    def usable(self, drv):
+        account = self._own(drv)
+        return account is not None and not account.dropped and account.benched_until <= time.time()
+
+    def pace(self, drv):
+        account = self._own(drv)
+        if account is None:
+            return
+        with self._lock:
+            wait = account.last_used + self.min_interval - time.time()
+            account.last_used = max(account.last_used, time.time()) + max(wait, 0)
+            account.loads += 1
+        if wait > 0:
+            time.sleep(wait)
+
+    def drop(self, drv, kind):
+        # Logged out => out for the run; throttled/blocked => benched for the cooldown.
+        # Returns True when another account can take over.
+        account = self._own(drv)
+        with self._lock:
+            if account is not None and len(self.active()) > 1:
+                if kind == "blocked":
+                    account.benched_until = time.time() + self.cooldown
+                    log(f"🧊 Account {account.name} throttled, benched for {self.cooldown:.0f}s")
+                else:
+                    account.dropped = kind
+                    log(f"🚪 Account {account.name} {kind.replace('_', ' ')}, removed from rotation")
+                return True
+        return False
+
+    def summary(self):
+        return ", ".join(f"{a.name}={a.loads}{' (' + a.dropped + ')' if a.dropped else ''}" for a in self.accounts)
@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+from datetime import date
+from cdp_driver import CDPError, CDPTimeout, launch_chrome, kill_chrome, devtools_json
+from stocklist_cache import load_columns
+from sheets_client import open_client
+from layout import EXPECTED_COUNT, DAY_UPDATES_PER_ROW, row_name_and_url, day_row_payload
+
+# Asyncio day scraper: K pages in one Chrome process share its cache and
+# session, and scrape K symbols concurrently over a single CDP websocket.
+# Writes the same MV2 DAY layout as run_scraper.py.
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+# ---------------- CONFIG ---------------- #
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "500"))
+START_ROW = SHARD_INDEX * SHARD_SIZE
+END_ROW = START_ROW + SHARD_SIZE
+
+PAGES = int(os.getenv("PAGES", "4"))
+BATCH_SIZE = 50
+WAIT_TIMEOUT = 20
+PAGE_LOAD_TIMEOUT = 40
+COOKIE_FILE = os.getenv("COOKIE_FILE", "cookies.json")
+VALUE_SELECTOR = "[class*='valueValue']"
+
+CHROME_ARGS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--window-size=1920,1080",
+    "--disable-blink-features=AutomationControlled",
+    "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+]
+
+# ---------------- BROWSER ---------------- #
+class AsyncBrowser:
+    # One websocket to the browser target; pages are flattened sessions on it
+    def __init__(self):
+        self._ws = None
+        self._proc = None
+        self._profile = None
+        self._msg_id = 0
+        self._pending = {}
+        self._pages = {}
+        self._reader = None
+
+    async def start(self):
+        from websockets.asyncio.client import connect
+
+        self._proc, self._profile, port = await asyncio.to_thread(launch_chrome, CHROME_ARGS)
+        try:
+            info = await asyncio.to_thread(devtools_json, port, "/json/version")
+            self._ws = await connect(info["webSocketDebuggerUrl"], max_size=None)
+        except Exception:
+            kill_chrome(self._proc, self._profile)
+            raise
+        self._reader = asyncio.create_task(self._read_loop())
+        return self
+
+    async def _read_loop(self):
+        try:
+            async for raw in self._ws:
+                msg = json.loads(raw)
+                if "id" in msg:
+                    fut = self._pending.pop(msg["id"], None)
+                    if fut and not fut.done():
+                        fut.set_result(msg)
+                else:
+                    page = self._pages.get(msg.get("sessionId"))
+                    if page:
+                        page.on_event(msg.get("method"))
+        finally:
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(CDPError("Browser connection closed"))
+            self._pending.clear()
+
+    async def send(self, method, session_id=None, timeout=30, **params):
+        self._msg_id += 1
+        msg_id = self._msg_id
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = fut
+        msg = {"id": msg_id, "method": method, "params": params}
+        if session_id:
+            msg["sessionId"] = session_id
+        await self._ws.send(json.dumps(msg))
+        try:
+            res = await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(msg_id, None)
+            raise CDPTimeout(f"{method} timed out after {timeout}s")
+        if "error" in res:
+            raise CDPError(f"{method}: {res['error'].get('message')}")
+        return res.get("result", {})
+
+    async def new_page(self):
+        target = await self.send("Target.createTarget", url="about:blank")
+        attached = await self.send("Target.attachToTarget", targetId=target["targetId"], flatten=True)
+        page = AsyncPage(self, target["targetId"], attached["sessionId"])
+        self._pages[page.session_id] = page
+        await page.send("Page.enable")
+        return page
+
+    async def close_page(self, page):
+        self._pages.pop(page.session_id, None)
+        try:
+            await self.send("Target.closeTarget", targetId=page.target_id, timeout=5)
+        except Exception:
+            pass
+
+    async def set_cookies(self, cookies):
+        # Browser-wide, so every page shares the one logged-in session
+        params = []
+        for c in cookies:
+            p = {k: v for k, v in c.items() if k in ("name", "value", "path", "secure", "domain")}
+            if "expiry" in c:
+                p["expires"] = c["expiry"]
+            if "domain" not in p:
+                p["url"] = "https://in.tradingview.com/"
+            params.append(p)
+        await self.send("Storage.setCookies", cookies=params)
+
+    async def close(self):
+        try:
+            await self.send("Browser.close", timeout=5)
+        except Exception:
+            pass
+        if self._ws:
+            await self._ws.close()
+        if self._reader:
+            self._reader.cancel()
+        if self._proc:
+            kill_chrome(self._proc, self._profile)
+
+class AsyncPage:
+    def __init__(self, browser, target_id, session_id):
+        self.browser = browser
+        self.target_id = target_id
+        self.session_id = session_id
+        self._waiters = {}
+
+    def on_event(self, method):
+        ev = self._waiters.get(method)
+        if ev:
+            ev.set()
+
+    async def send(self, method, **params):
+        return await self.browser.send(method, session_id=self.session_id, **params)
+
+    async def get(self, url, timeout=PAGE_LOAD_TIMEOUT):
+        loaded = self._waiters["Page.loadEventFired"] = asyncio.Event()
+        res = await self.send("Page.navigate", url=url)
+        if res.get("errorText"):
+            raise CDPError(f"Navigation failed: {res['errorText']}")
+        try:
+            await asyncio.wait_for(loaded.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise CDPTimeout(f"Page load timed out after {timeout}s")
+
+    async def evaluate(self, expression):
+        res = await self.send("Runtime.evaluate", expression=expression, returnByValue=True, awaitPromise=True)
+        if "exceptionDetails" in res:
+            raise CDPError(f"JS error: {res['exceptionDetails'].get('text')}")
+        return res.get("result", {}).get("value")
+
+    async def wait_for_selector(self, selector, timeout, poll=0.1):
+        expr = f"document.querySelector({json.dumps(selector)}) !== null"
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if await self.evaluate(expr):
+                return True
+            await asyncio.sleep(poll)
+        raise CDPTimeout(f"{selector} not found after {timeout}s")
+
+    async def texts(self, selector):
+        return await self.evaluate(
+            f"Array.from(document.querySelectorAll({json.dumps(selector)}))"
+            ".map(e => e.innerText.trim()).filter(t => t)"
+        ) or []
+
+# ---------------- SCRAPER ---------------- #
+async def scrape_day(browser, pages, url):
+    if not url: return [""] * EXPECTED_COUNT, "NOT OK", "", ""
+
+    for attempt in range(2):
+        page = await pages.get()
+        try:
+            await page.get(url)
+            await page.wait_for_selector(VALUE_SELECTOR, WAIT_TIMEOUT)
+
+            await asyncio.sleep(3) # Initial render wait
+            vals = await page.texts(VALUE_SELECTOR)
+
+            if len(vals) < EXPECTED_COUNT:
+                for scroll_y in [600, 1200, 2000]:
+                    await page.evaluate(f"window.scrollTo(0, {scroll_y})")
+                    await asyncio.sleep(1.5)
+                    new_vals = await page.texts(VALUE_SELECTOR)
+                    if len(new_vals) > len(vals): vals = new_vals
+                    if len(vals) >= EXPECTED_COUNT: break
+
+            browser_url = await page.evaluate("location.href")
+            pages.put_nowait(page)
+
+            if len(vals) >= EXPECTED_COUNT:
+                return vals[:EXPECTED_COUNT], "OK", url, browser_url
+            padded = (vals + [""] * EXPECTED_COUNT)[:EXPECTED_COUNT]
+            return padded, "NOT OK", url, browser_url
+
+        except Exception as e:
+            log(f"   ❌ Attempt {attempt + 1} Failed: {str(e)[:50]}")
+            # Replace the page rather than the whole browser
+            await replace_page(browser, pages, page)
+
+    return [""] * EXPECTED_COUNT, "NOT OK", url, ""
+
+async def replace_page(browser, pages, page):
+    # The pool must never shrink: keep the old page if Chrome won't open a new one
+    try:
+        fresh = await browser.new_page()
+    except Exception as e:
+        log(f"   ⚠️ New page failed, reusing the old one: {str(e)[:50]}")
+        pages.put_nowait(page)
+        return
+    await browser.close_page(page)
+    pages.put_nowait(fresh)
+
+async def process_row(i, browser, pages, company_list, url_list, current_date):
+    name, url = row_name_and_url(i, company_list, url_list)
+    vals, status, sheet_url_used, browser_url_used = await scrape_day(browser, pages, url)
+    log(f"🔍 [{i + 1}] {name} -> {status} ({len([v for v in vals if v])}/{EXPECTED_COUNT})")
+    return day_row_payload(i, name, current_date, vals, status, sheet_url_used, browser_url_used), status == "OK"
+
+# ---------------- SHEETS WRITER ---------------- #
+def api_retry(func, *args, **kwargs):
+    for attempt in range(5):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            wait = (2 ** attempt) + random.random()
+            log(f"⚠️ API Issue: {str(e)[:50]}. Retrying in {wait:.1f}s...")
+            time.sleep(wait)
+    return func(*args, **kwargs)
+
+async def sheets_writer(queue, sheet_data):
+    # Runs the blocking gspread call in a thread so pages keep scraping
+    batch_list = []
+    while True:
+        payload = await queue.get()
+        if payload is not None:
+            batch_list.extend(payload)
+        if batch_list and (payload is None or len(batch_list) // DAY_UPDATES_PER_ROW >= BATCH_SIZE):
+            log(f"🚀 Uploading batch of {len(batch_list) // DAY_UPDATES_PER_ROW} rows...")
+            await asyncio.to_thread(api_retry, sheet_data.batch_update, batch_list, value_input_option="RAW")
+            batch_list = []
+        if payload is None:
+            return
+
+# ---------------- MAIN ---------------- #
+def connect_sheets():
+    gc = open_client("credentials.json")
+    sh_main = gc.open("STOCKLIST 2").worksheet("Sheet1")
+    sh_data = gc.open("MV2 DAY").worksheet("Sheet1")
+    return sh_main, sh_data
+
+async def run(rows, company_list, url_list, sheet_data):
+    browser = await AsyncBrowser().start()
+    if os.path.exists(COOKIE_FILE):
+        try:
+            with open(COOKIE_FILE, "r", encoding="utf-8") as f:
+                await browser.set_cookies(json.load(f))
+        except Exception as e:
+            log(f"⚠️ Cookie error: {str(e)[:100]}")
+
+    pages = asyncio.Queue()
+    for _ in range(PAGES):
+        pages.put_nowait(await browser.new_page())
+
+    queue = asyncio.Queue(maxsize=BATCH_SIZE * 2)
+    writer = asyncio.create_task(sheets_writer(queue, sheet_data))
+    current_date = date.today().strftime("%m/%d/%Y")
+    sem = asyncio.Semaphore(PAGES)
+    retry_indices = []
+
+    async def to_writer(payload):
+        # A dead writer leaves the queue full; raise its error instead of blocking forever
+        put = asyncio.ensure_future(queue.put(payload))
+        await asyncio.wait({put, writer}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            writer.result()
+            raise RuntimeError("Sheets writer stopped early")
+
+    async def worker(i, failed):
+        async with sem:
+            payload, success = await process_row(i, browser, pages, company_list, url_list, current_date)
+        await to_writer(payload)
+        if not success and failed is not None:
+            failed.append(i)
+
+    try:
+        await run_all(worker(i, retry_indices) for i in rows)
+        if retry_indices:
+            log(f"🔁 Retrying {len(retry_indices)} symbols labeled 'NOT OK'...")
+            await run_all(worker(i, None) for i in sorted(retry_indices))
+    finally:
+        try:
+            if not writer.done():
+                await queue.put(None)
+            await writer
+        finally:
+            await browser.close()
+
+async def run_all(coros):
+    # Like gather, but one failure cancels the rest instead of leaving them running
+    tasks = [asyncio.create_task(c) for c in coros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def main():
+    try:
+        sheet_main, sheet_data = connect_sheets()
+        company_list, url_list = api_retry(load_columns, sheet_main, [1, 4])
+    except Exception as e:
+        log(f"❌ Connection Error: {e}")
+        sys.exit(1)
+
+    loop_end = min(END_ROW, len(company_list))
+    rows = list(range(START_ROW, loop_end))
+    log(f"✅ Starting rows {START_ROW + 1} to {loop_end} on {PAGES} pages")
+
+    t0 = time.time()
+    asyncio.run(run(rows, company_list, url_list, sheet_data))
+    elapsed = max(time.time() - t0, 1e-6)
+    log(f"🏁 ASYNC SCRAPING COMPLETED. {len(rows)} rows in {elapsed:.0f}s ({len(rows) * 60 / elapsed:.1f} rows/min)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import tempfile
+import statistics
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from webdriver_manager.chrome import ChromeDriverManager
+from cdp_driver import CDPDriver
+
+# Side-by-side latency benchmark of the Selenium and CDP driver backends.
+# Usage: python bench_driver.py [url] [iterations]
+# Without a URL a local page with a fake legend of 29 values is used.
+
+VALUE_SELECTOR = "[class*='valueValue']"
+CHROME_ARGS = ["--headless=new", "--no-sandbox", "--disable-dev-shm-usage", "--window-size=1920,1080"]
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def fake_legend_url(count=29):
+    cells = "".join(f'<div class="valueValue-l31H9iuA">{i}.{i}</div>' for i in range(count))
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "legend.html")
+    with open(path, "w") as f:
+        f.write(f"<html><body><div data-qa-id='legend'>{cells}</div></body></html>")
+    return "file://" + path
+
+# ---------------- BACKENDS ---------------- #
+def selenium_driver():
+    opts = Options()
+    for arg in CHROME_ARGS:
+        opts.add_argument(arg)
+    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=opts)
+
+def selenium_values(drv):
+    return [el.text.strip() for el in drv.find_elements(By.CSS_SELECTOR, VALUE_SELECTOR) if el.text.strip()]
+
+def selenium_row(drv, url):
+    drv.get(url)
+    WebDriverWait(drv, 20).until(EC.presence_of_element_located((By.CSS_SELECTOR, VALUE_SELECTOR)))
+    return selenium_values(drv), drv.current_url
+
+def cdp_row(drv, url):
+    drv.get(url)
+    drv.wait_for_selector(VALUE_SELECTOR, 20)
+    return drv.texts(VALUE_SELECTOR), drv.current_url
+
+BACKENDS = {
+    "selenium": (selenium_driver, selenium_values, selenium_row),
+    "cdp": (lambda: CDPDriver(args=CHROME_ARGS), lambda d: d.texts(VALUE_SELECTOR), cdp_row),
+}
+
+# ---------------- BENCH ---------------- #
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"mean {statistics.mean(samples):8.2f}ms | p50 {statistics.median(samples):8.2f}ms | p95 {p95:8.2f}ms"
+
+def bench(name, url, n):
+    factory, values, row = BACKENDS[name]
+    t0 = time.perf_counter()
+    drv = factory()
+    results = {"launch": [(time.perf_counter() - t0) * 1000]}
+    try:
+        drv.get(url)
+        results["current_url"] = timed(lambda: drv.current_url, n)
+        results["execute_script"] = timed(lambda: drv.execute_script("return 1;"), n)
+        results["get_values"] = timed(lambda: values(drv), n)
+        results["row (get+wait+extract)"] = timed(lambda: row(drv, url), max(1, n // 10))
+    finally:
+        drv.quit()
+    return results
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else fake_legend_url()
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    log(f"⏱️ Benchmarking {n} iterations against {url}")
+
+    all_results = {}
+    for name in BACKENDS:
+        try:
+            all_results[name] = bench(name, url, n)
+        except Exception as e:
+            log(f"❌ {name} failed: {str(e)[:100]}")
+
+    for metric in ("launch", "current_url", "execute_script", "get_values", "row (get+wait+extract)"):
+        log(f"📊 {metric}")
+        for name, res in all_results.items():
+            if metric in res:
+                log(f"   {name:<9} {summarize(res[metric])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import random
+import runpy
+import tempfile
+import contextlib
+from types import SimpleNamespace
+from collections import Counter, defaultdict
+
+# Fault-injection benchmark for the recovery paths.
+# Runs a real job script against local stand-ins for Chrome and Google Sheets
+# and injects faults at configurable rates (per page load / per Sheets write):
+#   crash     Chrome dies; every call fails until the driver is replaced
+#   hang      the page load never finishes; get() raises TimeoutException at the page-load timeout
+#   partial   the legend renders only a third of its values
+#   http429   Sheets write rejected for quota
+#   http500   Sheets write fails with a backend error
+#   grid      Sheets write lands beyond the grid (fails until the sheet is resized)
+# A fault-free run with the same seed goes first, so the report has rows lost,
+# duplicate scrapes and recovery time per fault type plus the total overhead.
+# The clock runs SPEED times faster (sleeps and waits shrink together); all
+# times are reported in real-world seconds.
+# Usage: python bench_faults.py [day|week|group|clean] [rows] [--faults crash=0.05,hang=0.05,partial=0.1,http429=0.05,http500=0.05,grid=0.02]
+#                               [--speed 20] [--seed 1] [--no-baseline] [--verbose] [--json out.json]
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = {"day": "run_scraper.py", "week": "run_scraper1.py", "group": "test.py", "clean": "cleaner.py"}
+STOCKLIST_COLS = {"day": (1, 4), "week": (1, 8), "group": (1, 3, 4), "clean": (1, 4)}
+DEFAULT_FAULTS = "crash=0.03,hang=0.03,partial=0.08,http429=0.05,http500=0.05,grid=0.02"
+BROWSER_FAULTS = ("crash", "hang", "partial")
+SHEET_FAULTS = ("http429", "http500", "grid")
+LEGEND_VALUES = 29          # values on a full legend (enough for every job)
+LOAD_SECONDS = (1.5, 3.0)   # page load time range
+CLEAN_STATUS_COL = 25       # cleaner.py status column (Y)
+# Faults a job can't see or has no recovery for would only ever score as "never":
+# group keeps just the last 3 legend values, so a partial legend still succeeds,
+# and only group resizes the sheet on a grid-limit error
+NOT_APPLICABLE = {"day": ("grid",), "week": ("grid",), "group": ("partial",), "clean": ("grid",)}
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", file=sys.__stdout__, flush=True)
+
+# ---------------- CLOCK ---------------- #
+# Installed before the repo modules are imported, so their sleeps and timeouts all run fast
+_real_time, _real_sleep, _real_monotonic = time.time, time.sleep, time.monotonic
+_epoch, _mono_epoch = _real_time(), _real_monotonic()
+SPEED = 20.0
+
+def fast_time():
+    return _epoch + (_real_time() - _epoch) * SPEED
+
+def fast_monotonic():
+    return _mono_epoch + (_real_monotonic() - _mono_epoch) * SPEED
+
+def fast_sleep(seconds):
+    _real_sleep(max(seconds, 0) / SPEED)
+
+class FastQueue(queue.Queue):
+    # queue.Queue waits on the real monotonic clock it bound at import; shrink the
+    # timeout instead, so the writer's max_age flush runs on the fast clock too
+    def get(self, block=True, timeout=None):
+        return super().get(block, None if timeout is None else timeout / SPEED)
+
+# ---------------- FAULT LOG ---------------- #
+class FaultLog:
+    def __init__(self, rates, seed):
+        self.rates = rates
+        self.rng = random.Random(seed)
+        self.injected = Counter()
+        self.recovery = defaultdict(list)  # kind -> seconds until the affected work succeeded
+        self.pending = []                  # (kind, key, t)
+        self.full_loads = Counter()        # url -> loads that rendered the full legend
+
+    def roll(self, kinds):
+        # At most one fault per operation
+        r = self.rng.random()
+        for kind in kinds:
+            r -= self.rates.get(kind, 0)
+            if r < 0:
+                return kind
+        return None
+
+    def fault(self, kind, key):
+        self.injected[kind] += 1
+        self.pending.append((kind, key, time.time()))
+
+    def recovered(self, key):
+        now = time.time()
+        still = []
+        for kind, k, t in self.pending:
+            if k == key:
+                self.recovery[kind].append(now - t)
+            else:
+                still.append((kind, k, t))
+        self.pending = still
+
+    def unrecovered(self):
+        return Counter(kind for kind, _, _ in self.pending)
+
+    def duplicates(self):
+        return sum(n - 1 for n in self.full_loads.values() if n > 1)
+
+# ---------------- CHROME STAND-IN ---------------- #
+class FakeElement:
+    def __init__(self, text):
+        self.text = text
+
+def fake_chrome_class(faults):
+    from selenium.common.exceptions import WebDriverException, TimeoutException
+    from page_state import PROBE_JS
+    from extractors import GROUP_VALUE_CLASS
+
+    class FakeChrome:
+        def __init__(self, *args, **kwargs):
+            self.url = "about:blank"
+            self.dead = False
+            self.fault = None
+            self.counted = True
+            self.page_load_timeout = 300  # selenium's default
+
+        def _alive(self):
+            if self.dead:
+                raise WebDriverException("disconnected: not connected to DevTools (bench: Chrome killed)")
+
+        def get(self, url):
+            self._alive()
+            self.url, self.fault, self.counted = url, None, False
+            if "bench.local" not in url:
+                return  # cookie bootstrap page
+            kind = faults.roll(BROWSER_FAULTS)
+            if kind:
+                faults.fault(kind, url)
+            if kind == "crash":
+                self.dead = True
+                self._alive()
+            self.fault = kind
+            if kind == "hang":
+                # the load never completes, so Chrome gives up at the page-load timeout
+                time.sleep(self.page_load_timeout)
+                raise TimeoutException(f"timeout: Timed out receiving message from renderer: {self.page_load_timeout:.3f}")
+            time.sleep(faults.rng.uniform(*LOAD_SECONDS))
+
+        def refresh(self):
+            self.get(self.url)
+
+        def _values(self):
+            self._alive()
+            if "bench.local" not in self.url or self.fault == "hang":
+                return []
+            n = LEGEND_VALUES // 3 if self.fault == "partial" else LEGEND_VALUES
+            if n == LEGEND_VALUES and not self.counted:
+                self.counted = True
+                faults.full_loads[self.url] += 1
+                faults.recovered(self.url)
+            return [f"{i}.{len(self.url) % 10}" for i in range(n)]
+
+        def execute_script(self, script, *args):
+            self._alive()
+            if script == PROBE_JS:
+                if "bench.local" not in self.url or self.fault == "hang":
+                    return "loading"
+                return "values"
+            return None
+
+        def find_elements(self, by, selector):
+            return [FakeElement(v) for v in self._values()]
+
+        @property
+        def page_source(self):
+            cells = "".join(f'<div class="{GROUP_VALUE_CLASS}">{v}</div>' for v in self._values())
+            return f"<html><body><div data-qa-id='legend'>{cells}</div></body></html>"
+
+        @property
+        def current_url(self):
+            self._alive()
+            return self.url
+
+        def add_cookie(self, cookie):
+            self._alive()
+
+        def delete_all_cookies(self):
+            self._alive()
+
+        def set_page_load_timeout(self, seconds):
+            self.page_load_timeout = seconds
+
+        def quit(self):
+            self.dead = True
+
+    return FakeChrome
+
+# ---------------- SHEETS STAND-IN ---------------- #
+def col_letter_to_num(col):
+    num = 0
+    for c in col:
+        num = num * 26 + (ord(c.upper()) - ord("A") + 1)
+    return num
+
+class FakeWorksheet:
+    def __init__(self, faults, title, spreadsheet, columns=None, rows=0):
+        self.faults = faults
+        self.title = title
+        self.spreadsheet = spreadsheet
+        self.columns = columns or {}   # stocklist: col number -> values
+        self.row_count = rows + 20
+        self.cells = {}
+        self.writes = Counter()        # sheet row -> times written
+
+    # ---- reads ---- #
+    def batch_get(self, ranges, major_dimension="COLUMNS"):
+        return [[self.columns.get(col_letter_to_num(r.split(":")[0]), [])] for r in ranges]
+
+    def col_values(self, col):
+        rows = [r for r, c in self.cells if c == col]
+        return [self.cells.get((r, col), "") for r in range(1, max(rows, default=0) + 1)]
+
+    def row_values(self, row):
+        cols = [c for r, c in self.cells if r == row]
+        return [self.cells.get((row, c), "") for c in range(1, max(cols, default=0) + 1)]
+
+    # ---- writes ---- #
+    def _write(self, updates, track=True):
+        rows = [int(n) for u in updates for n in re.findall(r"[A-Z]+(\d+)", u["range"].split("!")[-1])]
+        # a sheet still too small keeps failing until it is resized; no new fault is rolled meanwhile
+        kind = None if rows and max(rows) > self.row_count else self.faults.roll(SHEET_FAULTS)
+        if kind == "grid" and rows:
+            self.row_count = max(rows) - 1
+            self.faults.fault(kind, "sheet")
+        elif kind:
+            self.faults.fault(kind, "sheet")
+            raise Exception("APIError: [429]: Quota exceeded for quota metric 'Write requests'" if kind == "http429"
+                            else "APIError: [500]: Internal error encountered.")
+        if rows and max(rows) > self.row_count:
+            raise Exception(f"APIError: [400]: Range ({self.title}!A{max(rows)}) exceeds grid limits. Max rows: {self.row_count}")
+        for u in updates:
+            m = re.match(r"([A-Z]+)(\d+)", u["range"].split("!")[-1])
+            row, col = int(m.group(2)), col_letter_to_num(m.group(1))
+            for dr, values in enumerate(u["values"]):
+                for dc, v in enumerate(values):
+                    self.cells[(row + dr, col + dc)] = v
+        if track:
+            for row in set(rows):
+                self.writes[row] += 1
+        self.faults.recovered("sheet")
+
+    def batch_update(self, updates, value_input_option=None):
+        self._write(updates)
+
+    def update(self, range_name, values):
+        # cleaner.py's live status update; only batch writes count as saving a row
+        self._write([{"range": range_name, "values": values}], track=False)
+
+    def resize(self, rows=None):
+        self.row_count = rows
+
+class FakeSpreadsheet:
+    def __init__(self, title, sheets):
+        self.title = title
+        self.lastUpdateTime = ""
+        self.sheets = sheets
+
+    def worksheet(self, tab):
+        return self.sheets[(self.title, tab)]
+
+class FakeClient:
+    def __init__(self, faults, job, rows):
+        self.faults = faults
+        self.job = job
+        self.rows = rows
+        self.sheets = {}
+        self.output = None
+        self.sheets_session = SimpleNamespace(metrics=None, stats={})  # what sheets_client expects on a client
+
+    def open(self, title):
+        return _Opener(self, title)
+
+    def sheet(self, title, tab):
+        if (title, tab) not in self.sheets:
+            if self.output is None and self.sheets:
+                # second sheet a job opens is its output
+                ws = FakeWorksheet(self.faults, tab, FakeSpreadsheet(title, self.sheets), rows=self.rows)
+                if self.job == "clean":
+                    ws.cells[(1, CLEAN_STATUS_COL)] = "Status"
+                    for r in range(2, self.rows + 2):
+                        ws.cells[(r, CLEAN_STATUS_COL)] = "NOT OK"
+                self.output = ws
+            else:
+                cols = {1: ["Name"] + [f"SYM{i}" for i in range(1, self.rows + 1)]}
+                for c in STOCKLIST_COLS[self.job][1:]:
+                    cols[c] = ["URL"] + [f"https://bench.local/chart/{i}?col={c}" for i in range(1, self.rows + 1)]
+                ws = FakeWorksheet(self.faults, tab, FakeSpreadsheet(title, self.sheets), columns=cols)
+            self.sheets[(title, tab)] = ws
+        return self.sheets[(title, tab)]
+
+class _Opener:
+    def __init__(self, client, title):
+        self.client, self.title = client, title
+
+    def worksheet(self, tab):
+        return self.client.sheet(self.title, tab)
+
+# ---------------- RUN ---------------- #
+def run(job, rows, rates, seed, verbose):
+    import selenium.webdriver
+    import selenium.webdriver.chrome.service as chrome_service
+    import driver_pool
+    import sheets_client
+
+    faults = FaultLog(rates, seed)
+    client = FakeClient(faults, job, rows)
+    selenium.webdriver.Chrome = fake_chrome_class(faults)
+    chrome_service.Service = lambda *args, **kwargs: None
+    driver_pool._chromedriver_path = "chromedriver"
+    sheets_client._clients["credentials.json"] = client
+
+    workdir = tempfile.mkdtemp(prefix=f"bench_{job}_")
+    env = {"SHARD_INDEX": "0", "SHARD_SIZE": str(rows + 1), "SHARD_STEP": "1", "DRIVER_BACKEND": "selenium",
+           "WORK_QUEUE": "", "PREFETCH": "0", "COOKIE_POOL": "", "ROW_LIMIT": "0"}
+    saved_env = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    t0 = time.time()
+    try:
+        # left open: background threads may still log after the script returns
+        out = open(os.path.join(workdir, "run.log"), "w")
+        with contextlib.redirect_stdout(sys.__stdout__ if verbose else out):
+            try:
+                runpy.run_path(os.path.join(REPO, SCRIPTS[job]), run_name="__main__")
+            except SystemExit:
+                pass
+    finally:
+        elapsed = time.time() - t0
+        os.chdir(cwd)
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+    summary = {}
+    try:
+        with open(os.path.join(workdir, "metrics", f"{job}_0.json")) as f:
+            summary = json.load(f)
+    except Exception:
+        pass
+    out = client.output
+    written = set(out.writes) if out else set()
+    target = set(range(2, rows + 2))
+    return {
+        "workdir": workdir,
+        "seconds": round(elapsed, 1),
+        "rows_lost": len(target - written),
+        "duplicate_scrapes": faults.duplicates(),
+        "rows_rewritten": sum(1 for r in target if out and out.writes[r] > 1),
+        "injected": dict(faults.injected),
+        "unrecovered": dict(faults.unrecovered()),
+        "recovery": {k: {"count": len(v), "mean_s": round(sum(v) / len(v), 1), "max_s": round(max(v), 1),
+                         "total_s": round(sum(v), 1)} for k, v in faults.recovery.items()},
+        "counters": summary.get("counters", {}),
+    }
+
+def parse_faults(spec):
+    rates = {}
+    for part in spec.split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            if k.strip() not in BROWSER_FAULTS + SHEET_FAULTS:
+                raise SystemExit(f"unknown fault type: {k.strip()}")
+            rates[k.strip()] = float(v)
+    return rates
+
+def report(job, rows, base, res):
+    log(f"📊 {job}: {rows} rows | {res['seconds']:.0f}s with faults"
+        + (f" vs {base['seconds']:.0f}s clean → recovery overhead {res['seconds'] - base['seconds']:+.0f}s "
+           f"({(res['seconds'] - base['seconds']) / rows:+.1f}s/row)" if base else ""))
+    log(f"   rows lost {res['rows_lost']} | duplicate scrapes {res['duplicate_scrapes']} "
+        f"(clean run {base['duplicate_scrapes'] if base else '-'}) | rows written twice {res['rows_rewritten']}")
+    c = res["counters"]
+    log(f"   restarts {c.get('restarts', 0)} | retries {c.get('retries', 0)} | flush errors {c.get('flush_errors', 0)} "
+        f"| rows ok {c.get('rows_ok', 0)} / not ok {c.get('rows_not_ok', 0)}")
+    log(f"   {'fault':<9} {'injected':>8} {'recovered':>9} {'mean':>7} {'max':>7} {'total':>8} {'never':>6}")
+    for kind in BROWSER_FAULTS + SHEET_FAULTS:
+        n = res["injected"].get(kind, 0)
+        if not n:
+            continue
+        r = res["recovery"].get(kind, {"count": 0, "mean_s": 0, "max_s": 0, "total_s": 0})
+        log(f"   {kind:<9} {n:>8} {r['count']:>9} {r['mean_s']:>6.1f}s {r['max_s']:>6.1f}s {r['total_s']:>7.1f}s "
+            f"{res['unrecovered'].get(kind, 0):>6}")
+    log(f"   logs: {res['workdir']}/run.log")
+
+def main():
+    global SPEED
+    args = sys.argv[1:]
+    opts = {}
+    for flag in ("--faults", "--speed", "--seed", "--json"):
+        if flag in args:
+            i = args.index(flag)
+            opts[flag] = args[i + 1]
+            del args[i:i + 2]
+    verbose = "--verbose" in args
+    baseline = "--no-baseline" not in args
+    args = [a for a in args if not a.startswith("--")]
+    job = args[0] if args else "day"
+    rows = int(args[1]) if len(args) > 1 else 60
+    if job not in SCRIPTS:
+        raise SystemExit(f"usage: python bench_faults.py [{'|'.join(SCRIPTS)}] [rows] [--faults ...]")
+    rates = parse_faults(opts.get("--faults", DEFAULT_FAULTS))
+    skipped = [k for k in NOT_APPLICABLE[job] if rates.pop(k, 0)]
+    seed = int(opts.get("--seed", "1"))
+    SPEED = float(opts.get("--speed", SPEED))
+
+    time.time, time.sleep, time.monotonic = fast_time, fast_sleep, fast_monotonic
+    queue.Queue = FastQueue
+    sys.path.insert(0, REPO)
+    log(f"🧪 {job}: {rows} rows, faults {rates}, clock x{SPEED:.0f}")
+    if skipped:
+        log(f"   skipping {', '.join(skipped)}: not a recoverable fault for {job}")
+    base = None
+    if baseline:
+        log("   fault-free baseline...")
+        base = run(job, rows, {}, seed, verbose)
+    log("   with faults...")
+    res = run(job, rows, rates, seed, verbose)
+    report(job, rows, base, res)
+    if "--json" in opts:
+        with open(opts["--json"], "w") as f:
+            json.dump({"job": job, "rows": rows, "faults": rates, "baseline": base, "faulted": res}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
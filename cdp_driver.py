@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+import urllib.request
+
+# Minimal Chrome DevTools Protocol driver.
+# Talks to Chrome over its debugging websocket directly (no chromedriver hop)
+# and only exposes what the scrapers use: get/refresh, wait for selector,
+# evaluate/execute_script, cookies, current_url, page_source and tab switching.
+
+# ---------------- CONFIG ---------------- #
+CHROME_BIN = os.getenv("CHROME_BIN", "")
+CHROME_CANDIDATES = ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"]
+LAUNCH_TIMEOUT = 20
+
+class CDPError(Exception):
+    pass
+
+class CDPTimeout(CDPError):
+    pass
+
+def find_chrome():
+    if CHROME_BIN:
+        return CHROME_BIN
+    for name in CHROME_CANDIDATES:
+        path = shutil.which(name)
+        if path:
+            return path
+    raise CDPError("Chrome binary not found (set CHROME_BIN)")
+
+def launch_chrome(args=()):
+    # Returns (process, profile_dir, port); Chrome picks a free port itself
+    profile = tempfile.mkdtemp(prefix="cdp_profile_")
+    cmd = [find_chrome(), "--remote-debugging-port=0", f"--user-data-dir={profile}",
+           "--no-first-run", "--no-default-browser-check"]
+    cmd += [a for a in args if not a.startswith("--remote-debugging")]
+    cmd.append("about:blank")
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # Chrome writes the chosen port to DevToolsActivePort once it listens
+    port_file = os.path.join(profile, "DevToolsActivePort")
+    deadline = time.time() + LAUNCH_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            kill_chrome(proc, profile)
+            raise CDPError(f"Chrome exited on launch (code {proc.returncode})")
+        try:
+            with open(port_file) as f:
+                return proc, profile, int(f.readline().strip())
+        except (OSError, ValueError):
+            time.sleep(0.05)
+    kill_chrome(proc, profile)
+    raise CDPTimeout("Chrome did not open a debugging port")
+
+def kill_chrome(proc, profile):
+    try:
+        proc.terminate()
+        proc.wait(timeout=5)
+    except Exception:
+        try: proc.kill()
+        except: pass
+    shutil.rmtree(profile, ignore_errors=True)
+
+def devtools_json(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=LAUNCH_TIMEOUT) as r:
+        return json.load(r)
+
+# ---------------- DRIVER ---------------- #
+class _SwitchTo:
+    # drv.switch_to.window(handle), as in Selenium
+    def __init__(self, drv):
+        self._drv = drv
+
+    def window(self, handle):
+        self._drv._switch(handle)
+
+class CDPDriver:
+    def __init__(self, args=(), page_load_strategy="normal", page_load_timeout=60):
+        # websockets is only needed for this backend
+        from websockets.sync.client import connect
+
+        self.page_load_strategy = page_load_strategy
+        self.page_load_timeout = page_load_timeout
+        self._msg_id = 0
+        self._seen = set()
+        self._connect = connect
+        self._proc, self._profile, self._port = launch_chrome(args)
+        self.switch_to = _SwitchTo(self)
+
+        try:
+            self._attach(self._pages()[0])
+        except Exception:
+            self._kill()
+            raise
+
+    # ---- launch helpers ---- #
+    def _pages(self):
+        pages = [t for t in devtools_json(self._port, "/json/list") if t.get("type") == "page"]
+        if not pages:
+            raise CDPError("No page target available")
+        return pages
+
+    def _attach(self, target):
+        self._target = target["id"]
+        self._seen = set()
+        self._ws = self._connect(target["webSocketDebuggerUrl"], max_size=None, open_timeout=LAUNCH_TIMEOUT)
+        self.send("Page.enable")
+        self.send("Network.enable")
+
+    def _kill(self):
+        kill_chrome(self._proc, self._profile)
+
+    # ---- protocol ---- #
+    def _recv(self, timeout):
+        try:
+            msg = json.loads(self._ws.recv(timeout=timeout))
+        except TimeoutError:
+            return None
+        if "method" in msg:
+            self._seen.add(msg["method"])
+        return msg
+
+    def send(self, method, timeout=30, **params):
+        self._msg_id += 1
+        msg_id = self._msg_id
+        self._ws.send(json.dumps({"id": msg_id, "method": method, "params": params}))
+        deadline = time.time() + timeout
+        while True:
+            left = deadline - time.time()
+            if left <= 0:
+                raise CDPTimeout(f"{method} timed out after {timeout}s")
+            msg = self._recv(left)
+            if msg is None or msg.get("id") != msg_id:
+                continue
+            if "error" in msg:
+                raise CDPError(f"{method}: {msg['error'].get('message')}")
+            return msg.get("result", {})
+
+    def wait_event(self, method, timeout):
+        deadline = time.time() + timeout
+        while method not in self._seen:
+            left = deadline - time.time()
+            if left <= 0:
+                raise CDPTimeout(f"{method} not received after {timeout}s")
+            self._recv(left)
+
+    # ---- navigation ---- #
+    def _load_event(self):
+        return "Page.domContentEventFired" if self.page_load_strategy == "eager" else "Page.loadEventFired"
+
+    def get(self, url):
+        self._seen.clear()
+        res = self.send("Page.navigate", url=url)
+        if res.get("errorText"):
+            raise CDPError(f"Navigation failed: {res['errorText']}")
+        self.wait_event(self._load_event(), self.page_load_timeout)
+
+    def refresh(self):
+        self._seen.clear()
+        self.send("Page.reload")
+        self.wait_event(self._load_event(), self.page_load_timeout)
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    # ---- evaluation ---- #
+    def evaluate(self, expression):
+        res = self.send("Runtime.evaluate", expression=expression, returnByValue=True, awaitPromise=True)
+        if "exceptionDetails" in res:
+            raise CDPError(f"JS error: {res['exceptionDetails'].get('text')}")
+        return res.get("result", {}).get("value")
+
+    def execute_script(self, script, *args):
+        return self.evaluate(f"(function(){{{script}}}).apply(null, {json.dumps(list(args))})")
+
+    def wait_for_selector(self, selector, timeout, poll=0.1):
+        expr = f"document.querySelector({json.dumps(selector)}) !== null"
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.evaluate(expr):
+                return True
+            time.sleep(poll)
+        raise CDPTimeout(f"{selector} not found after {timeout}s")
+
+    def texts(self, selector):
+        # One round trip for all legend values (Selenium needs 1 + N)
+        return self.evaluate(
+            f"Array.from(document.querySelectorAll({json.dumps(selector)}))"
+            ".map(e => e.innerText.trim()).filter(t => t)"
+        ) or []
+
+    @property
+    def current_url(self):
+        return self.evaluate("location.href")
+
+    @property
+    def page_source(self):
+        return self.evaluate("document.documentElement.outerHTML")
+
+    # ---- tabs (same names as Selenium) ---- #
+    @property
+    def window_handles(self):
+        return [t["id"] for t in self._pages()]
+
+    @property
+    def current_window_handle(self):
+        return self._target
+
+    def _switch(self, handle):
+        target = next((t for t in self._pages() if t["id"] == handle), None)
+        if target is None:
+            raise CDPError(f"No tab {handle}")
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+        self._attach(target)
+
+    # ---- cookies ---- #
+    def add_cookie(self, cookie):
+        params = {k: v for k, v in cookie.items() if k in ("name", "value", "path", "secure", "domain")}
+        if "expiry" in cookie:
+            params["expires"] = cookie["expiry"]
+        if "domain" not in params:
+            params["url"] = self.current_url
+        self.send("Network.setCookie", **params)
+
+    def delete_all_cookies(self):
+        self.send("Network.clearBrowserCookies")
+
+    def get_cookies(self):
+        return self.send("Network.getCookies").get("cookies", [])
+
+    def quit(self):
+        try:
+            self.send("Browser.close", timeout=5)
+        except Exception:
+            pass
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+        self._kill()
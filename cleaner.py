@@ -1,21 +1,36 @@
+import os
+import sys
 import time
-import json
 import random
 from datetime import date
-import gspread
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from cdp_driver import CDPDriver
+from timeouts import LatencyHistory
+from driver_pool import HotSpare, HOT_SPARE, chromedriver_path
+from stocklist_cache import load_columns
+from sheets_writer import BackgroundFlusher
+from metrics import Metrics
+from sheets_client import open_client, log_stats
+from accounts import AccountPool, pool_paths, COOKIE_POOL
+from deadline import Budget, stop_on_sigterm, read_handoff, write_handoff, clear_handoff
+from page_state import wait_for_chart, classify_exception, AuthGuard, AuthLost, OK, PARTIAL, LOGGED_OUT, BLOCKED
 
 # ---------------- CONFIG ---------------- #
 EXPECTED_COUNT = 22
 DAY_OUTPUT_START_COL = 3
 COOKIE_FILE = "cookies.json"
-CHROME_DRIVER_PATH = ChromeDriverManager().install()
+STOCKLIST_SHEET = os.getenv("STOCKLIST_SHEET", "STOCKLIST 2")
+STOCKLIST_TAB = os.getenv("STOCKLIST_TAB", "Sheet1")
+STOCKLIST_COLS = [int(c) for c in os.getenv("STOCKLIST_COLS", "1,4").split(",")]  # name, chart URL
+OUTPUT_SHEET = os.getenv("OUTPUT_SHEET", "MV2 DAY")
+OUTPUT_TAB = os.getenv("OUTPUT_TAB", "Sheet1")
+DRIVER_BACKEND = os.getenv("DRIVER_BACKEND", "selenium")  # "selenium" or "cdp"
+VALUE_SELECTOR = "[class*='valueValue']"
+WAIT_TIMEOUT = 20  # ceiling; per-URL waits are learned from latency history
+CHROME_DRIVER_PATH = chromedriver_path()
 
 # ---------------- LOG ---------------- #
 def log(msg):
@@ -48,6 +63,7 @@ def api_retry(func, *args, **kwargs):
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            metrics.inc("api_retries")
             wait = (2 ** attempt) + random.random()
             log(f"⚠️ API retry in {wait:.1f}s...")
             time.sleep(wait)
@@ -55,62 +71,123 @@ def api_retry(func, *args, **kwargs):
 
 # ---------------- DRIVER ---------------- #
 driver = None
+history = LatencyHistory()
+metrics = Metrics("clean", os.getenv("SHARD_INDEX", "0"))
+# Stops taking rows in time to save everything when JOB_BUDGET / DEADLINE is set
+budget = Budget(metrics)
+stop_on_sigterm()
+
+CHROME_ARGS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--window-size=1920,1080",
+]
 
 def create_driver():
-    log("🌐 Starting browser...")
-    opts = Options()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--window-size=1920,1080")
-
-    drv = webdriver.Chrome(service=Service(CHROME_DRIVER_PATH), options=opts)
+    log(f"🌐 Starting browser ({DRIVER_BACKEND})...")
+    drv = None
+    if DRIVER_BACKEND == "cdp":
+        try:
+            drv = CDPDriver(args=CHROME_ARGS)
+        except Exception as e:
+            log(f"⚠️ CDP launch failed: {str(e)[:50]}. Falling back to Selenium")
+    if drv is None:
+        opts = Options()
+        for arg in CHROME_ARGS:
+            opts.add_argument(arg)
+        drv = webdriver.Chrome(service=Service(CHROME_DRIVER_PATH), options=opts)
 
     try:
-        drv.get("https://in.tradingview.com/")
-        with open(COOKIE_FILE, "r") as f:
-            cookies = json.load(f)
-        for c in cookies:
-            drv.add_cookie({k: v for k, v in c.items() if k in ("name","value","path","secure","expiry")})
-        drv.refresh()
-        time.sleep(2)
+        apply_cookies(drv)
     except:
         pass
 
     return drv
 
+# One cookie file per account (COOKIE_POOL), falling back to COOKIE_FILE
+accounts = AccountPool(pool_paths(COOKIE_POOL, COOKIE_FILE), offset=int(os.getenv("SHARD_INDEX", "0")))
+
+def apply_cookies(drv):
+    # Binds the driver to an account (a new one if its account was dropped) and loads its cookies
+    account = accounts.assign(drv)
+    if account is None:
+        return
+    drv.get("https://in.tradingview.com/")
+    drv.delete_all_cookies()
+    for c in account.cookies():
+        drv.add_cookie(c)
+    drv.refresh()
+    time.sleep(2)
+
+# Logged-out/blocked pages get one cookie re-auth, then another account; the run aborts when none is left
+auth = AuthGuard(apply_cookies, metrics=metrics, accounts=accounts)
+
+# Standby browser warmed in the background so restarts don't pay the cold start
+spare = HotSpare(create_driver, [DRIVER_BACKEND] + CHROME_ARGS) if HOT_SPARE else None
+
 def ensure_driver():
     global driver
     if driver is None:
-        driver = create_driver()
+        driver = spare.take() if spare else create_driver()
+        if accounts and not accounts.usable(driver):
+            # standby was warmed with an account that has since been dropped
+            try:
+                apply_cookies(driver)
+            except:
+                pass
     return driver
 
 def restart_driver():
     global driver
     if driver:
-        try:
-            driver.quit()
-        except:
-            pass
+        metrics.inc("restarts")
+        if spare:
+            spare.retire(driver)
+        else:
+            try:
+                driver.quit()
+            except:
+                pass
     driver = None
 
 # ---------------- SCRAPER ---------------- #
 def get_values(drv):
-    elements = drv.find_elements(By.CSS_SELECTOR, "[class*='valueValue']")
+    if isinstance(drv, CDPDriver):
+        return drv.texts(VALUE_SELECTOR)
+    elements = drv.find_elements(By.CSS_SELECTOR, VALUE_SELECTOR)
     return [el.text.strip() for el in elements if el.text.strip()]
 
+def wait_for_values(drv, timeout):
+    return wait_for_chart(drv, VALUE_SELECTOR, timeout)
+
 def scrape_day(url):
     if not url:
         return [""] * EXPECTED_COUNT, "NOT OK", "", ""
+    timeout = history.timeout_for(url, WAIT_TIMEOUT)
 
+    state = None
     for attempt in range(2):
         try:
             drv = ensure_driver()
+            accounts.pace(drv)
+            t0 = time.time()
             drv.get(url)
 
-            WebDriverWait(drv, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "[class*='valueValue']"))
-            )
+            t_wait = time.time()
+            state = wait_for_values(drv, timeout)
+            if state != OK:
+                log(f"   🚫 Attempt {attempt+1}: {state.replace('_', ' ')} after {time.time() - t0:.0f}s")
+                if state in (LOGGED_OUT, BLOCKED):
+                    if not auth.on_failure(drv, state):
+                        break
+                else:
+                    auth.on_failure(drv, state)
+                    restart_driver()
+                continue
+            auth.ok()
+            history.record(url, time.time() - t_wait, True)
+            metrics.observe("page_load", time.time() - t0)
 
             time.sleep(3)
             vals = get_values(drv)
@@ -132,21 +209,30 @@ def scrape_day(url):
                 log(f"   ✅ Found {count}/{EXPECTED_COUNT}")
                 return vals[:EXPECTED_COUNT], "OK", url, browser_url
             else:
+                metrics.inc(f"fail_{PARTIAL}")
                 log(f"   ⚠️ Found {count}/{EXPECTED_COUNT}")
                 padded = (vals + [""] * EXPECTED_COUNT)[:EXPECTED_COUNT]
                 return padded, "NOT OK", url, browser_url
 
-        except:
-            log(f"   ❌ Attempt {attempt+1} failed, restarting browser...")
+        except AuthLost:
+            raise
+        except Exception as e:
+            state = classify_exception(e)
+            metrics.inc("scrape_failures")
+            auth.on_failure(None, state)
+            log(f"   ❌ Attempt {attempt+1} failed ({state}), restarting browser...")
             restart_driver()
 
+    # A dead session says nothing about the URL itself
+    if state not in (LOGGED_OUT, BLOCKED):
+        history.record(url, 0, False)
     return [""] * EXPECTED_COUNT, "NOT OK", url, ""
 
 # ---------------- SHEETS ---------------- #
 def connect_sheets():
-    gc = gspread.service_account("credentials.json")
-    sh_main = gc.open("STOCKLIST 2").worksheet("Sheet1")
-    sh_data = gc.open("MV2 DAY").worksheet("Sheet1")
+    gc = open_client("credentials.json", metrics=metrics)
+    sh_main = gc.open(STOCKLIST_SHEET).worksheet(STOCKLIST_TAB)
+    sh_data = gc.open(OUTPUT_SHEET).worksheet(OUTPUT_TAB)
     return sh_main, sh_data
 
 # ---------------- FIND NOT OK ---------------- #
@@ -201,6 +287,8 @@ def process_row(sheet_row, company_list, url_list, sheet_data, current_date):
     final_status = "OK" if filled == EXPECTED_COUNT else "NOT OK"
 
     log(f"📊 Result → {name} | {filled}/{EXPECTED_COUNT} | {final_status}")
+    metrics.inc("rows")
+    metrics.inc("rows_ok" if final_status == "OK" else "rows_not_ok")
 
     # ⚡ LIVE STATUS UPDATE
     try:
@@ -223,37 +311,75 @@ def process_row(sheet_row, company_list, url_list, sheet_data, current_date):
 def main():
     sheet_main, sheet_data = connect_sheets()
 
-    company_list = api_retry(sheet_main.col_values, 1)
-    url_list = api_retry(sheet_main.col_values, 4)
+    company_list, url_list = api_retry(load_columns, sheet_main, STOCKLIST_COLS)
 
-    not_ok_rows = find_not_ok_rows(sheet_data, company_list)
+    # Rows the day scraper ran out of time for come first, then the NOT OK ones
+    handoff_rows, handoff_paths = read_handoff("day")
+    handoff_rows = [i + 1 for i in handoff_rows if i < len(company_list)]
+    handed_off = set(handoff_rows)
+    not_ok_rows = handoff_rows + [r for r in find_not_ok_rows(sheet_data, company_list) if r not in handed_off]
 
     if not not_ok_rows:
         log("✅ No NOT OK rows found")
+        metrics.write()
         return
 
     restart_driver()
-    batch = []
+    # Batches of 10 rows (3 updates each) upload in the background
+    flusher = BackgroundFlusher(sheet_data, batch_updates=30, metrics=metrics)
     current_date = date.today().strftime("%m/%d/%Y")
 
     total = len(not_ok_rows)
+    auth_lost = None
+    done = 0
 
-    for idx, row in enumerate(not_ok_rows):
-        log(f"🔄 Progress: {idx+1}/{total}")
-
-        batch.extend(process_row(row, company_list, url_list, sheet_data, current_date))
-
-        if (idx + 1) % 10 == 0:
-            restart_driver()
-            log("🚀 Uploading batch...")
-            api_retry(sheet_data.batch_update, batch, value_input_option="RAW")
-            batch = []
-
-    if batch:
+    try:
+        for idx, row in enumerate(not_ok_rows):
+            if not budget.allows():
+                break
+            log(f"🔄 Progress: {idx+1}/{total}")
+
+            t_row = time.time()
+            with metrics.timer("row"):
+                payload = process_row(row, company_list, url_list, sheet_data, current_date)
+            budget.row_done(time.time() - t_row)
+            flusher.put(payload)
+            done += 1
+            budget.report(total - done)
+
+            if (idx + 1) % 10 == 0:
+                restart_driver()
+    except AuthLost as e:
+        auth_lost = e
+    except BaseException:
+        # the driver in use is quit rather than handed on, the standby is parked or quit
+        restart_driver()
+        if spare:
+            spare.close()
+        raise
+    finally:
         log("🚀 Final upload...")
-        api_retry(sheet_data.batch_update, batch, value_input_option="RAW")
-
-    restart_driver()
+        if not flusher.close():
+            log(f"🛑 {flusher.backlog_rows} rows could not be saved")
+        # Hand-off rows not reached go back into a hand-off; NOT OK rows stay NOT OK in the sheet anyway
+        for path in handoff_paths:
+            clear_handoff(path)
+        write_handoff("day", "clean", [r - 1 for r in not_ok_rows[done:] if r in handed_off],
+                      "session lost" if auth_lost else "time budget")
+
+    history.save()
+    # With runner.py the open browsers are handed to the next job instead of quit
+    if spare:
+        spare.close(driver)
+    else:
+        restart_driver()
+    if len(accounts.accounts) > 1:
+        log(f"👥 Page loads per account: {accounts.summary()}")
+    log_stats(open_client("credentials.json"))
+    metrics.write()
+    if auth_lost:
+        log(f"🛑 Cleaner aborted, TradingView session lost: {auth_lost}. Refresh the cookies and re-run.")
+        sys.exit(1)
     log("🏁 CLEANER COMPLETED SUCCESSFULLY")
 
 # ---------------- RUN ---------------- #
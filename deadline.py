@@ -0,0 +1,143 @@
+import os
+import json
+import glob
+import time
+import signal
+from collections import deque
+from datetime import datetime, date
+
+# Wall-clock budget for a job.
+# Per-row times are tracked over a rolling window to predict when the job will
+# finish; once the next row would run into the margin kept for the final flush
+# and checkpoint, no new rows are started. Rows left undone are written to a
+# hand-off file that the next run of the same shard (and cleaner.py, for the
+# day job) processes first. The workflows carry handoff/ between Actions runs
+# in actions/cache, per job and shard.
+#   JOB_BUDGET=19800                 seconds from process start (runner.py: shared by its jobs)
+#   DEADLINE=2026-01-05T16:30:00     or an absolute time (ISO, local time, or unix seconds)
+
+# ---------------- CONFIG ---------------- #
+JOB_BUDGET = float(os.getenv("JOB_BUDGET", "0"))
+DEADLINE = os.getenv("DEADLINE", "")
+DEADLINE_MARGIN = float(os.getenv("DEADLINE_MARGIN", "120"))  # kept free for the final flush + checkpoint
+ROW_WINDOW = 20          # rows in the rolling per-row estimate
+DEFAULT_ROW_SECONDS = 30  # estimate before the first row has finished
+REPORT_EVERY = 25
+HANDOFF_DIR = os.getenv("HANDOFF_DIR", "handoff")
+RUN_ID = os.getenv("RUN_ID", date.today().isoformat())
+
+# runner.py re-imports this module for every job, so it passes its own start time
+_STARTED = float(os.getenv("RUNNER_STARTED") or time.time())
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def deadline_from_env():
+    # Earliest of DEADLINE and process start + JOB_BUDGET; None when neither is set
+    limits = []
+    if JOB_BUDGET > 0:
+        limits.append(_STARTED + JOB_BUDGET)
+    if DEADLINE:
+        try:
+            limits.append(float(DEADLINE))
+        except ValueError:
+            try:
+                limits.append(datetime.fromisoformat(DEADLINE).timestamp())
+            except ValueError:
+                log(f"⚠️ Ignoring unreadable DEADLINE={DEADLINE!r}")
+    return min(limits) if limits else None
+
+def stop_on_sigterm():
+    # A runner timeout/cancel sends SIGTERM; raising lets the scripts' except/finally blocks save the batch
+    def handler(signum, frame):
+        raise KeyboardInterrupt("SIGTERM")
+    try:
+        signal.signal(signal.SIGTERM, handler)
+    except ValueError:
+        pass  # not the main thread
+
+class Budget:
+    def __init__(self, metrics=None, deadline=None, margin=DEADLINE_MARGIN):
+        self.deadline = deadline if deadline is not None else deadline_from_env()
+        self.margin = margin
+        self.metrics = metrics
+        self.samples = deque(maxlen=ROW_WINDOW)
+        self.rows = 0
+        self.stopped = False
+        if self.deadline:
+            log(f"⏰ Time budget: {self.left() / 60:.0f} min left ({self.margin:.0f}s kept for the final save)")
+
+    def left(self):
+        return self.deadline - time.time() if self.deadline else float("inf")
+
+    def row_done(self, seconds):
+        self.samples.append(seconds)
+        self.rows += 1
+
+    def per_row(self):
+        # Upper quartile of the recent rows: one slow page shouldn't stop the job, a slow streak should
+        if not self.samples:
+            return DEFAULT_ROW_SECONDS
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.75))]
+
+    def allows(self):
+        # True while one more row fits before the margin; logs once when the job has to stop
+        if not self.deadline:
+            return True
+        if self.left() - self.margin >= self.per_row():
+            return True
+        if not self.stopped:
+            self.stopped = True
+            log(f"⏰ Time budget reached ({self.left():.0f}s left, ~{self.per_row():.1f}s/row), no new rows")
+            if self.metrics:
+                self.metrics.inc("deadline_stops")
+        return False
+
+    def report(self, rows_left):
+        # Periodic ETA against the budget
+        if not self.deadline or not self.rows or self.rows % REPORT_EVERY:
+            return
+        eta = self.per_row() * rows_left
+        fits = "✅" if eta <= self.left() - self.margin else "⚠️ won't fit,"
+        log(f"⏳ {self.per_row():.1f}s/row, {rows_left} rows left ≈ {eta / 60:.0f} min | {fits} {self.left() / 60:.0f} min budget left")
+
+# ---------------- HAND-OFF ---------------- #
+def handoff_path(job, shard):
+    return os.path.join(HANDOFF_DIR, f"{job}_{shard}.json")
+
+def write_handoff(job, shard, rows, reason):
+    # rows: 0-based stocklist indices. An empty list clears the shard's hand-off.
+    path = handoff_path(job, shard)
+    rows = sorted(set(rows))
+    if not rows:
+        clear_handoff(path)
+        return
+    try:
+        os.makedirs(HANDOFF_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"job": job, "shard": shard, "run": RUN_ID, "reason": reason, "rows": rows}, f)
+        log(f"📝 {len(rows)} unfinished rows handed off to {path}")
+    except Exception as e:
+        log(f"⚠️ Hand-off write failed: {str(e)[:80]}")
+
+def read_handoff(job, shard="*"):
+    # Returns (rows, paths); shard "*" collects every shard's hand-off for the job
+    rows, paths = set(), []
+    for path in sorted(glob.glob(handoff_path(job, shard))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rows.update(json.load(f)["rows"])
+            paths.append(path)
+        except Exception:
+            pass
+    if rows:
+        log(f"📝 Picking up {len(rows)} rows handed off by an earlier run")
+    return sorted(rows), paths
+
+def clear_handoff(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+# Hot-spare browser: a standby driver is launched and authenticated in a
+# background thread while the current one works, so a restart swaps to it
+# immediately and starts warming the next. Old drivers are quit in the
+# background too, so neither launch nor shutdown sits in the row loop.
+# When several jobs run in one process (runner.py), browsers still open at
+# the end of a job are parked under their browser options and handed to any
+# later HotSpare with the same options: the next slice of an interleaved job,
+# or another job with the same browser setup. A browser keeps its account, so
+# a job whose cookie pool has that account skips the cookie bootstrap.
+
+HOT_SPARE = os.getenv("HOT_SPARE", "1") == "1"
+
+MAX_PARKED = 2  # per setup: a job's current browser and its standby
+
+_parked = {}  # options -> drivers
+_parked_lock = threading.Lock()
+_keep_browsers = False
+_chromedriver_path = None
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def _quit(drv):
+    try:
+        drv.quit()
+    except Exception:
+        pass
+
+def chromedriver_path():
+    # Resolved once per process; every job in a runner shares it
+    global _chromedriver_path
+    if _chromedriver_path is None:
+        from webdriver_manager.chrome import ChromeDriverManager
+        _chromedriver_path = ChromeDriverManager().install()
+    return _chromedriver_path
+
+def keep_browsers(enabled=True):
+    global _keep_browsers
+    _keep_browsers = enabled
+
+def park(drv, key):
+    # Keeps drv for a later job with the same key when enabled, otherwise quits it
+    if drv is None:
+        return
+    if _keep_browsers:
+        with _parked_lock:
+            drivers = _parked.setdefault(key, [])
+            if len(drivers) < MAX_PARKED:
+                drivers.append(drv)
+                return
+    _quit(drv)
+
+def unpark(key):
+    with _parked_lock:
+        drivers = _parked.get(key)
+        if not drivers:
+            return None
+        return drivers.pop()
+
+def close_parked():
+    with _parked_lock:
+        drivers = [drv for k in list(_parked) for drv in _parked.pop(k)]
+    for drv in drivers:
+        _quit(drv)
+
+class HotSpare:
+    def __init__(self, factory, options=()):
+        # options (backend, Chrome args, load strategy/timeout) decide which parked browsers fit
+        self.factory = factory
+        self.key = tuple(options) if options else None
+        self._warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spare")
+        self._reaper = ThreadPoolExecutor(max_workers=2, thread_name_prefix="reaper")
+        self._future = None
+        self.swaps = 0
+        self.wait_seconds = 0.0
+
+    def warm(self):
+        if self._future is None:
+            drv = unpark(self.key) if self.key else None
+            if drv is not None:
+                self._future = Future()
+                self._future.set_result(drv)
+            else:
+                self._future = self._warmer.submit(self.factory)
+
+    def take(self):
+        # Returns the standby driver (waiting for it if still warming) and starts the next one
+        self.warm()
+        t0 = time.time()
+        try:
+            drv = self._future.result()
+        except Exception as e:
+            log(f"⚠️ Standby browser failed to start: {str(e)[:80]}. Starting one inline")
+            drv = None
+        self._future = None
+        if drv is None:
+            drv = self.factory()
+        waited = time.time() - t0
+        self.swaps += 1
+        self.wait_seconds += waited
+        log(f"🔄 Swapped to standby browser (waited {waited:.1f}s)")
+        self.warm()
+        return drv
+
+    def retire(self, drv):
+        if drv is not None:
+            self._reaper.submit(_quit, drv)
+
+    def _park(self, drv):
+        # Unkeyed spares have nothing to match a later job against, so their browsers are quit
+        if self.key:
+            park(drv, self.key)
+        elif drv is not None:
+            _quit(drv)
+
+    def close(self, current=None):
+        # current: the driver in use, parked along with the standby when keep_browsers is on
+        self._park(current)
+        if self._future is not None:
+            try:
+                self._park(self._future.result())
+            except Exception:
+                pass
+            self._future = None
+        self._warmer.shutdown(wait=True)
+        self._reaper.shutdown(wait=True)
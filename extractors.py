@@ -0,0 +1,31 @@
+from bs4 import BeautifulSoup
+
+# HTML-based legend extractors. test.py extracts through these, and
+# snapshots.py replays them (and the CSS equivalents of the live Selenium
+# lookups in the day/week scrapers) against recorded pages.
+
+VALUE_SELECTOR = "[class*='valueValue']"
+WEEK_VALUE_SELECTOR = "div[class*='valueValue']"
+GROUP_VALUE_CLASS = "valueValue-l31H9iuA apply-common-tooltip"
+GROUP_XPATH = '/html/body/div[2]/div/div[5]/div/div[1]/div/div[2]/div[1]/div[2]/div/div[1]/div[2]/div[2]/div[2]/div[2]/div'
+
+def css_values(html, selector=VALUE_SELECTOR):
+    # Same as the day/week get_values: non-empty stripped texts of matching elements
+    soup = BeautifulSoup(html, "html.parser")
+    texts = [el.get_text().strip() for el in soup.select(selector)]
+    return [t for t in texts if t]
+
+def group_values(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return [
+        el.get_text().replace('−', '-').replace('∅', 'None')
+        for el in soup.find_all("div", class_=GROUP_VALUE_CLASS)
+    ]
+
+def group_xpath_present(html):
+    # None when lxml isn't installed (it is only needed for offline replay)
+    try:
+        from lxml import html as lxml_html
+    except ImportError:
+        return None
+    return bool(lxml_html.fromstring(html).xpath(GROUP_XPATH))
@@ -0,0 +1,41 @@
+# Row/column layout of the MV2 DAY sheet, shared by the sync and async day scrapers.
+
+# ---------------- CONFIG ---------------- #
+EXPECTED_COUNT = 29
+DAY_OUTPUT_START_COL = 3
+
+# ---------------- UTILS ---------------- #
+def col_num_to_letter(n):
+    result = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        result = chr(65 + rem) + result
+    return result
+
+DAY_START_COL_LETTER = col_num_to_letter(DAY_OUTPUT_START_COL)
+DAY_END_COL_LETTER = col_num_to_letter(DAY_OUTPUT_START_COL + EXPECTED_COUNT - 1)
+
+STATUS_COL_NUM = DAY_OUTPUT_START_COL + EXPECTED_COUNT
+STATUS_COL = col_num_to_letter(STATUS_COL_NUM)
+SHEET_URL_COL = col_num_to_letter(DAY_OUTPUT_START_COL + EXPECTED_COUNT + 1)
+BROWSER_URL_COL = col_num_to_letter(DAY_OUTPUT_START_COL + EXPECTED_COUNT + 2)
+
+# Number of range updates day_row_payload produces per row
+DAY_UPDATES_PER_ROW = 6
+
+def row_name_and_url(i, company_list, url_list):
+    name = company_list[i].strip() if i < len(company_list) else ""
+    # the sheet gets the URL as written; normalize_url() is only for dedup keys
+    url = url_list[i].strip() if i < len(url_list) and "http" in url_list[i] else None
+    return name, url
+
+def day_row_payload(i, name, current_date, vals, status, sheet_url_used, browser_url_used):
+    row_idx = i + 1
+    return [
+        {"range": f"A{row_idx}", "values": [[name]]},
+        {"range": f"B{row_idx}", "values": [[current_date]]},
+        {"range": f"{DAY_START_COL_LETTER}{row_idx}:{DAY_END_COL_LETTER}{row_idx}", "values": [vals]},
+        {"range": f"{STATUS_COL}{row_idx}", "values": [[status]]},
+        {"range": f"{SHEET_URL_COL}{row_idx}", "values": [[sheet_url_used]]},
+        {"range": f"{BROWSER_URL_COL}{row_idx}", "values": [[browser_url_used]]}
+    ]
@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Run metrics: counters and histograms kept during a run and written at the end
+# as a Prometheus textfile (<job>_<shard>.prom) and a JSON summary (<job>_<shard>.json).
+#   python metrics.py compare old.json new.json
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+PREFIX = "tv_scraper"
+BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 20, 30, 60, 120]
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0
+
+class Metrics:
+    def __init__(self, job, shard=0):
+        self.job = job
+        self.shard = str(shard)
+        self.started = time.time()
+        self.counters = {}
+        self.samples = {}
+        self._lock = threading.Lock()  # the Sheets writer thread reports too
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - t0)
+
+    # ---- output ---- #
+    def summary(self):
+        with self._lock:
+            counters = dict(self.counters)
+            samples = {k: list(v) for k, v in self.samples.items()}
+        duration = max(time.time() - self.started, 1e-6)
+        rows = counters.get("rows", 0)
+        return {
+            "job": self.job,
+            "shard": self.shard,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "duration_s": round(duration, 1),
+            "rows_per_min": round(rows * 60 / duration, 2),
+            "ok_ratio": round(counters.get("rows_ok", 0) / rows, 4) if rows else 0,
+            "counters": counters,
+            "histograms": {
+                name: {"count": len(v), "sum": round(sum(v), 3), "p50": round(percentile(v, 0.5), 3),
+                       "p95": round(percentile(v, 0.95), 3), "max": round(max(v), 3)}
+                for name, v in samples.items() if v
+            },
+        }
+
+    def prometheus(self, summary):
+        labels = f'job="{self.job}",shard="{self.shard}"'
+        lines = [
+            f"{PREFIX}_duration_seconds{{{labels}}} {summary['duration_s']}",
+            f"{PREFIX}_rows_per_minute{{{labels}}} {summary['rows_per_min']}",
+            f"{PREFIX}_ok_ratio{{{labels}}} {summary['ok_ratio']}",
+        ]
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines.append(f"{PREFIX}_{name}_total{{{labels}}} {value}")
+        with self._lock:
+            samples = {k: list(v) for k, v in self.samples.items()}
+        for name, values in sorted(samples.items()):
+            lines.append(f"# TYPE {PREFIX}_{name}_seconds histogram")
+            for b in BUCKETS:
+                lines.append(f'{PREFIX}_{name}_seconds_bucket{{{labels},le="{b}"}} {sum(1 for v in values if v <= b)}')
+            lines.append(f'{PREFIX}_{name}_seconds_bucket{{{labels},le="+Inf"}} {len(values)}')
+            lines.append(f"{PREFIX}_{name}_seconds_sum{{{labels}}} {sum(values):.3f}")
+            lines.append(f"{PREFIX}_{name}_seconds_count{{{labels}}} {len(values)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        summary = self.summary()
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            # runner.py tags each slice of a job so they don't overwrite each other
+            base = os.path.join(METRICS_DIR, f"{self.job}_{self.shard}{os.getenv('METRICS_SUFFIX', '')}")
+            with open(base + ".json", "w") as f:
+                json.dump(summary, f, indent=2)
+            with open(base + ".prom", "w") as f:
+                f.write(self.prometheus(summary))
+            log(f"📈 {summary['rows_per_min']} rows/min | OK ratio {summary['ok_ratio']:.1%} | Metrics -> {base}.json/.prom")
+        except Exception as e:
+            log(f"⚠️ Metrics write failed: {str(e)[:80]}")
+        return summary
+
+# ---------------- COMPARE ---------------- #
+def flatten(summary):
+    flat = {"duration_s": summary["duration_s"], "rows_per_min": summary["rows_per_min"], "ok_ratio": summary["ok_ratio"]}
+    flat.update({f"{k}_total": v for k, v in summary["counters"].items()})
+    for name, h in summary["histograms"].items():
+        flat[f"{name}_p50"] = h["p50"]
+        flat[f"{name}_p95"] = h["p95"]
+    return flat
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = flatten(json.load(f))
+    with open(new_path) as f:
+        new = flatten(json.load(f))
+    print(f"{'metric':<28}{'old':>12}{'new':>12}{'change':>10}")
+    for key in sorted(set(old) | set(new)):
+        a, b = old.get(key, 0), new.get(key, 0)
+        change = f"{(b - a) / a:+.1%}" if a else ("new" if b else "")
+        print(f"{key:<28}{a:>12}{b:>12}{change:>10}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "compare":
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        print("usage: python metrics.py compare old.json new.json")
@@ -0,0 +1,107 @@
+import os
+import time
+
+# Classifies what a chart load turned into, so an expired session is caught in
+# seconds instead of burning the full value wait on every row.
+# Only positive markers count: a sign-in dialog or an unauthenticated user
+# object means logged out, a captcha/throttle page means blocked. A chart whose
+# legend is merely slow keeps waiting until the timeout, like before.
+# AuthGuard re-applies the cookies once per streak, moves the driver to another
+# account when a pool has one, and gives up on the shard when the session stays dead.
+
+OK = "ok"
+LOGGED_OUT = "logged_out"
+BLOCKED = "blocked"
+NAV_TIMEOUT = "nav_timeout"
+PARTIAL = "legend_partial"
+CRASH = "crash"
+
+AUTH_FAIL_LIMIT = int(os.getenv("AUTH_FAIL_LIMIT", "3"))  # dead rows in a row (after re-auth) before aborting
+POLL = 0.5
+
+PROBE_JS = """
+var sel = arguments[0], xpath = arguments[1];
+var found = xpath
+    ? document.evaluate(sel, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+    : document.querySelector(sel);
+if (found) return "values";
+var text = document.body ? document.body.innerText.slice(0, 4000) : "";
+if (document.querySelector('iframe[src*="captcha"], iframe[src*="challenge"], .g-recaptcha, #challenge-form')
+    || /verify you are human|unusual traffic|too many requests|access denied/i.test(text)) return "blocked";
+if (document.querySelector('[data-dialog-name="sign-in"], .tv-signin-dialog')
+    || (window.user && window.user.is_authenticated === false)) return "logged_out";
+return "loading";
+"""
+
+class AuthLost(Exception):
+    pass
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def wait_for_chart(drv, selector, timeout, xpath=False):
+    # OK once the value selector shows up; LOGGED_OUT / BLOCKED as soon as the
+    # page says so; NAV_TIMEOUT when the wait runs out. Driver errors propagate.
+    t0 = time.time()
+    while True:
+        state = drv.execute_script(PROBE_JS, selector, xpath)
+        if state == "values":
+            return OK
+        if state == "blocked":
+            return BLOCKED
+        if state == "logged_out":
+            return LOGGED_OUT
+        if time.time() - t0 >= timeout:
+            return NAV_TIMEOUT
+        time.sleep(POLL)
+
+def classify_exception(e):
+    # TimeoutException (Selenium) / CDPTimeout => navigation timeout, anything else => crash
+    return NAV_TIMEOUT if "timeout" in type(e).__name__.lower() else CRASH
+
+class AuthGuard:
+    def __init__(self, reauth, limit=AUTH_FAIL_LIMIT, metrics=None, accounts=None):
+        self.reauth = reauth  # drv -> None, re-applies the cookies
+        self.limit = limit
+        self.metrics = metrics
+        self.accounts = accounts
+        self.reauthed = False
+        self.streak = 0
+        self.reauths = 0
+
+    def ok(self):
+        self.reauthed = False
+        self.streak = 0
+
+    def on_failure(self, drv, kind):
+        # True when the row is worth retrying on a freshly re-authenticated session
+        if self.metrics:
+            self.metrics.inc(f"fail_{kind}")
+        if kind not in (LOGGED_OUT, BLOCKED):
+            return True
+        if not self.reauthed:
+            self.reauthed = True
+            self.reauths += 1
+            if self.metrics:
+                self.metrics.inc("reauths")
+            log(f"🔑 Page looks {kind.replace('_', ' ')}, re-applying cookies once...")
+            try:
+                self.reauth(drv)
+            except Exception as e:
+                log(f"⚠️ Re-auth failed: {str(e)[:80]}")
+            return True
+        if self.accounts and drv is not None and self.accounts.drop(drv, kind):
+            # reauth binds the next account in the pool to this driver
+            if self.metrics:
+                self.metrics.inc("account_switches")
+            self.streak = 0
+            try:
+                self.reauth(drv)
+            except Exception as e:
+                log(f"⚠️ Account switch failed: {str(e)[:80]}")
+            return True
+        self.streak += 1
+        if self.streak >= self.limit:
+            raise AuthLost(f"session still {kind} after re-auth ({self.streak} rows in a row)")
+        return False
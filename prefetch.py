@@ -0,0 +1,66 @@
+import os
+import time
+
+# Speculative next-row loading in a second tab.
+# While the current tab's values are being extracted, the next row's chart is
+# already loading in the other tab; when that row comes up the tabs swap roles,
+# so a row costs about max(load, extract) instead of load + extract.
+# Both tabs are named (window.name) so window.open can navigate the idle one.
+
+PREFETCH = os.getenv("PREFETCH", "0") == "1"
+# Background tabs must keep loading and running timers at full speed
+PREFETCH_ARGS = [
+    "--disable-popup-blocking",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+]
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+class TabPrefetcher:
+    def __init__(self):
+        self.drv = None
+        self.url = None
+        self.started = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def prefetch(self, drv, url):
+        # Starts loading url in the idle tab without leaving the current one
+        try:
+            name = drv.execute_script("if (!window.name) window.name = 'tv_a'; return window.name;")
+            other = "tv_b" if name == "tv_a" else "tv_a"
+            drv.execute_script("window.open(arguments[0], arguments[1]);", url, other)
+            self.drv, self.url, self.started = drv, url, time.time()
+        except Exception as e:
+            log(f"⚠️ Prefetch failed: {str(e)[:80]}")
+            self.discard()
+
+    def take(self, drv, url):
+        # Switches to the prefetched tab when it holds url; returns its load start time or None
+        if self.drv is not drv or self.url != url:
+            if self.url:
+                self.misses += 1
+            self.discard()
+            return None
+        started = self.started
+        self.discard()
+        try:
+            current = drv.current_window_handle
+            other = next(h for h in drv.window_handles if h != current)
+            drv.switch_to.window(other)
+        except Exception as e:
+            log(f"⚠️ Prefetched tab unavailable: {str(e)[:80]}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += time.time() - started
+        log(f"   ⏩ Prefetched tab ready (loading for {time.time() - started:.1f}s)")
+        return started
+
+    def discard(self):
+        self.drv, self.url = None, None
@@ -1,17 +1,26 @@
 import sys
 import os
 import time
-import json
 import random
 from datetime import date
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import gspread
-from webdriver_manager.chrome import ChromeDriverManager
+from cdp_driver import CDPDriver
+from work_queue import open_work_queue
+from driver_pool import HotSpare, HOT_SPARE, chromedriver_path
+from url_index import normalize_url, build_url_index, duplicate_count
+from timeouts import LatencyHistory, DEAD_AFTER_RUNS, DEAD_URL_TIMEOUT, FLAKY_SCHEDULE, FLAKY_WAIT_FACTOR, FLAKY_RESTART_EVERY
+from snapshots import Recorder, dom_texts
+from stocklist_cache import load_columns
+from sheets_writer import BackgroundFlusher
+from metrics import Metrics
+from sheets_client import open_client, log_stats
+from accounts import AccountPool, pool_paths, COOKIE_POOL
+from prefetch import TabPrefetcher, PREFETCH, PREFETCH_ARGS
+from deadline import Budget, stop_on_sigterm, read_handoff, write_handoff
+from page_state import wait_for_chart, classify_exception, AuthGuard, AuthLost, OK, PARTIAL, LOGGED_OUT, BLOCKED
 
 def log(msg):
     t = time.strftime("%H:%M:%S")
@@ -22,15 +31,24 @@ SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
 SHARD_SIZE = int(os.getenv("SHARD_SIZE", "500"))
 START_ROW = SHARD_INDEX * SHARD_SIZE
 END_ROW = START_ROW + SHARD_SIZE
+ROW_LIMIT = int(os.getenv("ROW_LIMIT", "0"))  # runner.py: rows per slice, the next slice resumes from the checkpoint
 checkpoint_file = os.getenv("CHECKPOINT_FILE", f"checkpoint_week_{SHARD_INDEX}.txt")
+STOCKLIST_SHEET = os.getenv("STOCKLIST_SHEET", "Stock List")
+STOCKLIST_TAB = os.getenv("STOCKLIST_TAB", "Sheet1")
+STOCKLIST_COLS = [int(c) for c in os.getenv("STOCKLIST_COLS", "1,8").split(",")]  # name, chart URL (column H)
+OUTPUT_SHEET = os.getenv("OUTPUT_SHEET", "MV2 WEEK")
+OUTPUT_TAB = os.getenv("OUTPUT_TAB", "Sheet1")
 
 EXPECTED_COUNT = 17 
 BATCH_SIZE = 100 
 RESTART_EVERY_ROWS = 20
+WAIT_TIMEOUT = 15  # ceiling; per-URL waits are learned from latency history
 COOKIE_FILE = os.getenv("COOKIE_FILE", "cookies.json")
-CHROME_DRIVER_PATH = ChromeDriverManager().install()
+DRIVER_BACKEND = os.getenv("DRIVER_BACKEND", "selenium")  # "selenium" or "cdp"
+CHROME_DRIVER_PATH = chromedriver_path()
 
 WEEK_OUTPUT_START_COL = 3 
+VALUE_SELECTOR = "div[class*='valueValue']"
 
 # ---------------- UTILS ---------------- #
 def col_num_to_letter(n):
@@ -48,6 +66,7 @@ def api_retry(func, *args, **kwargs):
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            metrics.inc("api_retries")
             wait = (2 ** attempt) + random.random()
             log(f"⚠️ API Issue: {str(e)[:100]}. Retrying in {wait:.1f}s...")
             time.sleep(wait)
@@ -62,67 +81,141 @@ if os.path.exists(checkpoint_file):
 else:
     last_i = START_ROW
 
+history = LatencyHistory()
+metrics = Metrics("week", SHARD_INDEX)
+# Stops taking rows in time to save everything when JOB_BUDGET / DEADLINE is set
+budget = Budget(metrics)
+stop_on_sigterm()
+recorder = Recorder()
+
 # ---------------- DRIVER ---------------- #
 driver = None
 
+CHROME_ARGS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--window-size=1920,1080",
+    "--disable-gpu",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-blink-features=AutomationControlled",
+    "--incognito",
+    "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+] + (PREFETCH_ARGS if PREFETCH else [])
+
+# Next row's chart loads in a second tab while this one is extracted (PREFETCH=1)
+prefetcher = TabPrefetcher() if PREFETCH else None
+
 def create_driver():
-    log(f"🌐 [WEEK Shard {SHARD_INDEX}] Initializing browser...")
-    opts = Options()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--window-size=1920,1080")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--blink-settings=imagesEnabled=false")
-    opts.add_argument("--disable-blink-features=AutomationControlled")
-    opts.add_argument("--incognito")
-    opts.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
-    opts.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-
-    drv = webdriver.Chrome(service=Service(CHROME_DRIVER_PATH), options=opts)
+    log(f"🌐 [WEEK Shard {SHARD_INDEX}] Initializing browser ({DRIVER_BACKEND})...")
+    drv = None
+    if DRIVER_BACKEND == "cdp":
+        try:
+            drv = CDPDriver(args=CHROME_ARGS)
+        except Exception as e:
+            log(f"⚠️ CDP launch failed: {str(e)[:50]}. Falling back to Selenium")
+    if drv is None:
+        opts = Options()
+        for arg in CHROME_ARGS:
+            opts.add_argument(arg)
+        opts.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+        drv = webdriver.Chrome(service=Service(CHROME_DRIVER_PATH), options=opts)
     drv.set_page_load_timeout(60)
 
-    if os.path.exists(COOKIE_FILE):
-        try:
-            drv.get("https://in.tradingview.com/")
-            with open(COOKIE_FILE, "r", encoding="utf-8") as f:
-                cookies = json.load(f)
-            for c in cookies:
-                try:
-                    drv.add_cookie({k: v for k, v in c.items() if k in ("name", "value", "path", "secure", "expiry")})
-                except: continue
-            drv.refresh()
-            time.sleep(2)
+    if accounts:
+        try: apply_cookies(drv)
         except: pass
     return drv
 
+# One cookie file per account (COOKIE_POOL), falling back to COOKIE_FILE
+accounts = AccountPool(pool_paths(COOKIE_POOL, COOKIE_FILE), offset=SHARD_INDEX)
+
+def apply_cookies(drv):
+    # Binds the driver to an account (a new one if its account was dropped) and loads its cookies
+    account = accounts.assign(drv)
+    if account is None: return
+    drv.get("https://in.tradingview.com/")
+    drv.delete_all_cookies()
+    for c in account.cookies():
+        try: drv.add_cookie(c)
+        except: continue
+    drv.refresh()
+    time.sleep(2)
+
+# Logged-out/blocked pages get one cookie re-auth, then another account; the shard aborts when none is left
+auth = AuthGuard(apply_cookies, metrics=metrics, accounts=accounts)
+
+# Standby browser warmed in the background so restarts don't pay the cold start
+spare = HotSpare(create_driver, [DRIVER_BACKEND, "page_load_timeout=60"] + CHROME_ARGS) if HOT_SPARE else None
+if spare: spare.warm()
+
 def ensure_driver():
     global driver
-    if driver is None: driver = create_driver()
+    if driver is None:
+        driver = spare.take() if spare else create_driver()
+        if accounts and not accounts.usable(driver):
+            # standby was warmed with an account that has since been dropped
+            try: apply_cookies(driver)
+            except: pass
     return driver
 
 def restart_driver():
     global driver
+    if prefetcher: prefetcher.discard()
     if driver:
-        try: driver.quit()
-        except: pass
+        metrics.inc("restarts")
+        if spare: spare.retire(driver)
+        else:
+            try: driver.quit()
+            except: pass
     driver = None
 
+def drop_browsers():
+    # Crash path: the driver in use is quit rather than handed on, the standby is parked or quit
+    restart_driver()
+    if spare: spare.close()
+
 # ---------------- SCRAPER ---------------- #
 def get_values(drv):
     try:
-        elements = drv.find_elements(By.CSS_SELECTOR, "div[class*='valueValue']")
+        if isinstance(drv, CDPDriver):
+            return drv.texts(VALUE_SELECTOR)
+        elements = drv.find_elements(By.CSS_SELECTOR, VALUE_SELECTOR)
         return [el.text.strip() for el in elements if el.text.strip()]
     except: return []
 
-def scrape_week(url):
+def wait_for_values(drv, timeout):
+    return wait_for_chart(drv, VALUE_SELECTOR, timeout)
+
+def scrape_week(url, timeout=None, attempts=2, next_url=None):
     if not url: return [], False
-    for attempt in range(2):
+    if timeout is None:
+        timeout = history.timeout_for(url, WAIT_TIMEOUT)
+    state = None
+    for attempt in range(attempts):
         try:
             drv = ensure_driver()
-            drv.get(url)
-            wait = WebDriverWait(drv, 15)
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div[class*='valueValue']")))
+            t0 = prefetcher.take(drv, url) if prefetcher and attempt == 0 else None
+            if t0 is None:
+                accounts.pace(drv)
+                t0 = time.time()
+                drv.get(url)
+            t_wait = time.time()
+            state = wait_for_values(drv, timeout)
+            if state != OK:
+                log(f"   🚫 Scrape Attempt {attempt+1}: {state.replace('_', ' ')} after {time.time() - t0:.0f}s")
+                if state in (LOGGED_OUT, BLOCKED):
+                    if not auth.on_failure(drv, state): break
+                else:
+                    auth.on_failure(drv, state)
+                    restart_driver()
+                continue
+            auth.ok()
+            history.record(url, time.time() - t_wait, True)
+            metrics.observe("page_load", time.time() - t0)
+            if next_url and prefetcher:
+                accounts.pace(drv)
+                prefetcher.prefetch(drv, next_url)
             time.sleep(1.5)
             vals = get_values(drv)
             
@@ -131,21 +224,49 @@ def scrape_week(url):
                 time.sleep(1)
                 vals = get_values(drv)
 
+            recorder.maybe_record(url, lambda: drv.page_source, vals, "week_css", lambda: dom_texts(drv, VALUE_SELECTOR))
             if len(vals) >= EXPECTED_COUNT:
                 return vals[:EXPECTED_COUNT], True
+            metrics.inc(f"fail_{PARTIAL}")
             return vals, False # Partially found
+        except AuthLost:
+            raise
         except Exception as e:
-            log(f"   ❌ Scrape Attempt {attempt+1} Failed: {str(e)[:50]}")
+            state = classify_exception(e)
+            metrics.inc("scrape_failures")
+            auth.on_failure(None, state)
+            log(f"   ❌ Scrape Attempt {attempt+1} Failed ({state}): {str(e)[:50]}")
             restart_driver()
+    # A dead session says nothing about the URL itself
+    if state not in (LOGGED_OUT, BLOCKED):
+        history.record(url, 0, False)
     return [], False
 
 # ---------------- CORE LOGIC ---------------- #
-def process_row(i, company_list, url_list, current_date):
+def row_url(i, url_list):
+    return normalize_url(url_list[i]) if i < len(url_list) and "http" in url_list[i] else None
+
+# Results by normalised URL for the current pass; rows sharing a chart reuse them
+url_cache = {}
+dup_loads_avoided = 0
+
+def process_row(i, company_list, url_list, current_date, timeout=None, attempts=2, next_url=None):
+    global dup_loads_avoided
     name = company_list[i].strip() if i < len(company_list) else "Unknown"
-    url = url_list[i].strip() if i < len(url_list) and "http" in url_list[i] else None
+    url = row_url(i, url_list)
     
     log(f"🔍 [{i+1}] {name}")
-    vals, is_success = scrape_week(url)
+    if url and url in url_cache:
+        dup_loads_avoided += 1
+        metrics.inc("dup_loads_avoided")
+        log("   ♻️ Same chart as an earlier row, reusing its result")
+        vals, is_success = url_cache[url]
+    else:
+        if next_url == url or next_url in url_cache or history.is_dead(next_url):
+            next_url = None  # the next row won't load a page
+        vals, is_success = scrape_week(url, timeout, attempts, next_url)
+        if url:
+            url_cache[url] = (vals, is_success)
     
     row_idx = i + 1
     padded_vals = (vals + [""] * EXPECTED_COUNT)[:EXPECTED_COUNT]
@@ -159,64 +280,192 @@ def process_row(i, company_list, url_list, current_date):
 
 # ---------------- MAIN ---------------- #
 def connect_sheets():
-    gc = gspread.service_account("credentials.json")
-    sh_main = gc.open("Stock List").worksheet("Sheet1")
-    sh_data = gc.open("MV2 WEEK").worksheet("Sheet1")
+    gc = open_client("credentials.json", metrics=metrics)
+    sh_main = gc.open(STOCKLIST_SHEET).worksheet(STOCKLIST_TAB)
+    sh_data = gc.open(OUTPUT_SHEET).worksheet(OUTPUT_TAB)
     return sh_main, sh_data
 
 try:
     sheet_main, sheet_data = connect_sheets()
-    company_list = api_retry(sheet_main.col_values, 1)
-    url_list = api_retry(sheet_main.col_values, 8) # Column H
+    company_list, url_list = api_retry(load_columns, sheet_main, STOCKLIST_COLS)
     loop_end = min(END_ROW, len(company_list))
+    if ROW_LIMIT:
+        loop_end = min(loop_end, last_i + ROW_LIMIT)
     log(f"✅ Ready. Processing Rows {last_i + 1} to {loop_end}")
 except Exception as e:
-    log(f"❌ Initial Connection Error: {e}"); sys.exit(1)
+    log(f"❌ Initial Connection Error: {e}")
+    if spare: spare.close()
+    sys.exit(1)
 
 retry_indices = []
-batch_list = []
+dead_indices = []
+flaky_indices = []
 current_date = date.today().strftime("%m/%d/%Y")
 
+# Uploads happen on a background thread; the row loop only blocks if its queue fills up
+flusher = BackgroundFlusher(sheet_data, batch_updates=BATCH_SIZE * 3, metrics=metrics)
+
+# Shared lease table (WORK_QUEUE) replaces the fixed shard range when configured
+work_queue = open_work_queue("week")
+handoff_first = set()
+if work_queue:
+    log(f"📋 Claiming row blocks from work queue ({work_queue.job})")
+    row_iter = work_queue.rows(0, len(company_list))
+else:
+    # Rows an earlier run ran out of time for go first; they don't move the checkpoint
+    handoff_first = {r for r in read_handoff("week", SHARD_INDEX)[0] if START_ROW <= r < min(END_ROW, len(company_list))}
+    row_iter = sorted(handoff_first) + [r for r in range(last_i, loop_end) if r not in handoff_first]
+    url_index = build_url_index(row_iter, lambda i: row_url(i, url_list))
+    log(f"🔗 {len(url_index)} unique charts for {len(row_iter)} rows ({duplicate_count(url_index)} duplicates)")
+
+# URLs that keep missing on the first try (latency history) run after the reliable ones
+def is_flaky(i):
+    return FLAKY_SCHEDULE and history.is_flaky(row_url(i, url_list))
+
 # --- FIRST PASS ---
+auth_lost = None
+unfinished = []  # first-pass rows not started (budget / lost session), handed off at the end
+retried = dead_tried = flaky_done = 0
+reached = None  # checkpoint the first pass got to
+pos = 0
 try:
-    for i in range(last_i, loop_end):
-        payload, success = process_row(i, company_list, url_list, current_date)
-        batch_list.extend(payload)
-        
-        if not success:
-            retry_indices.append(i)
+    for pos, i in enumerate(row_iter):
+        if not budget.allows():
+            if not work_queue: unfinished.extend(row_iter[pos:])
+            break
+        # URLs that failed DEAD_AFTER_RUNS runs in a row wait for the end of the shard
+        if history.is_dead(row_url(i, url_list)):
+            log(f"🪦 [{i+1}] Known-dead URL, deferring to the end")
+            dead_indices.append(i)
+            metrics.inc("dead_deferred")
+        elif is_flaky(i) and i not in handoff_first:
+            flaky_indices.append(i)
+            metrics.inc("flaky_deferred")
+        else:
+            next_url = None
+            if prefetcher and not work_queue and pos + 1 < len(row_iter) and (i + 1) % RESTART_EVERY_ROWS \
+                    and not is_flaky(row_iter[pos + 1]):
+                next_url = row_url(row_iter[pos + 1], url_list)
+            t_row = time.time()
+            with metrics.timer("row"):
+                payload, success = process_row(i, company_list, url_list, current_date, next_url=next_url)
+            budget.row_done(time.time() - t_row)
+            history.note_first_try(row_url(i, url_list), success)
+            flusher.put(payload, on_saved=work_queue.on_saved(i) if work_queue else None)
+            metrics.inc("rows")
+            metrics.inc("rows_ok" if success else "rows_not_ok")
+            
+            if not success:
+                retry_indices.append(i)
 
-        with open(checkpoint_file, "w") as f: f.write(str(i + 1))
+        if not work_queue and i not in handoff_first:
+            reached = i + 1
+            # deferred flaky rows are still to do, so the checkpoint stops at the first of them
+            with open(checkpoint_file, "w") as f: f.write(str(min([reached] + flaky_indices)))
+        if not work_queue: budget.report(len(row_iter) - pos - 1)
         
-        if (i + 1) % RESTART_EVERY_ROWS == 0: restart_driver()
-
-        if len(batch_list) // 3 >= BATCH_SIZE:
-            log(f"🚀 Uploading batch of {BATCH_SIZE}...")
-            api_retry(sheet_data.batch_update, batch_list, value_input_option="RAW")
-            batch_list = []
-finally:
-    if batch_list:
-        api_retry(sheet_data.batch_update, batch_list, value_input_option="RAW")
-        batch_list = []
-
-# --- RETRY PASS ---
-if retry_indices:
-    log(f"🔁 Starting Retry Pass for {len(retry_indices)} symbols...")
-    restart_driver() 
-    
-    for idx, i in enumerate(retry_indices):
-        payload, success = process_row(i, company_list, url_list, current_date)
-        batch_list.extend(payload)
+        if (i + 1) % RESTART_EVERY_ROWS == 0:
+            restart_driver()
+            history.save()
+except AuthLost as e:
+    auth_lost = e
+    if not work_queue: unfinished.extend(row_iter[pos:])
+except BaseException:
+    # Save what was scraped before the crash (or a runner timeout)
+    flusher.close()
+    if not work_queue: write_handoff("week", SHARD_INDEX, list(row_iter[pos:]) + flaky_indices + retry_indices + dead_indices, "interrupted")
+    drop_browsers()
+    raise
+flusher.flush()
+
+try:
+    # --- FLAKY PASS ---
+    if flaky_indices and not auth_lost and not budget.stopped:
+        log(f"🌪️ {len(flaky_indices)} flaky symbols on fresh sessions ({FLAKY_WAIT_FACTOR:.1f}x waits)...")
+        restart_driver()
+        for idx, i in enumerate(flaky_indices):
+            if not budget.allows(): break
+            t_row = time.time()
+            payload, success = process_row(i, company_list, url_list, current_date, timeout=WAIT_TIMEOUT * FLAKY_WAIT_FACTOR)
+            budget.row_done(time.time() - t_row)
+            history.note_first_try(row_url(i, url_list), success)
+            flusher.put(payload, on_saved=work_queue.on_saved(i) if work_queue else None)
+            flaky_done += 1
+            metrics.inc("rows")
+            metrics.inc("rows_ok" if success else "rows_not_ok")
+            if not success:
+                retry_indices.append(i)
+
+            if (idx + 1) % FLAKY_RESTART_EVERY == 0:
+                restart_driver()
+        restart_driver()
+        flusher.flush()
+        if not work_queue and reached and flaky_done == len(flaky_indices):
+            with open(checkpoint_file, "w") as f: f.write(str(reached))
+
+    # --- RETRY PASS ---
+    if retry_indices and not auth_lost and not budget.stopped:
+        log(f"🔁 Starting Retry Pass for {len(retry_indices)} symbols...")
+        restart_driver() 
+        url_cache.clear()
         
-        # In retry pass, restart driver more often (every 10 rows) for stability
-        if (idx + 1) % 10 == 0: restart_driver()
+        for idx, i in enumerate(retry_indices):
+            if not budget.allows(): break
+            payload, success = process_row(i, company_list, url_list, current_date)
+            flusher.put(payload)
+            retried += 1
+            metrics.inc("retries")
+            if success:
+                metrics.inc("rows_not_ok", -1)
+                metrics.inc("rows_ok")
+                metrics.inc("retries_recovered")
             
-        if len(batch_list) // 3 >= 10: # Smaller batch for retries
-            api_retry(sheet_data.batch_update, batch_list, value_input_option="RAW")
-            batch_list = []
+            # In retry pass, restart driver more often (every 10 rows) for stability
+            if (idx + 1) % 10 == 0:
+                restart_driver()
+                flusher.flush()
+
+    # --- DEAD URL PASS ---
+    if dead_indices and not auth_lost and not budget.stopped:
+        log(f"🪦 Trying {len(dead_indices)} known-dead URLs once ({DEAD_URL_TIMEOUT:.0f}s wait, dead after {DEAD_AFTER_RUNS} failed runs)...")
+        url_cache.clear()
+        for i in dead_indices:
+            if not budget.allows(): break
+            payload, success = process_row(i, company_list, url_list, current_date, timeout=DEAD_URL_TIMEOUT, attempts=1)
+            flusher.put(payload, on_saved=work_queue.on_saved(i) if work_queue else None)
+            dead_tried += 1
+            metrics.inc("rows")
+            metrics.inc("rows_ok" if success else "rows_not_ok")
+except AuthLost as e:
+    auth_lost = e
+except BaseException:
+    flusher.close()
+    if not work_queue: write_handoff("week", SHARD_INDEX, unfinished + flaky_indices[flaky_done:] + retry_indices[retried:] + dead_indices[dead_tried:], "interrupted")
+    drop_browsers()
+    raise
 
-    if batch_list:
-        api_retry(sheet_data.batch_update, batch_list, value_input_option="RAW")
+if not flusher.close():
+    log(f"🛑 {flusher.backlog_rows} rows could not be saved")
+if not work_queue:
+    # With a work queue, blocks with rows not written yet (deferred or never reached) stay
+    # open and go back to the pool when their lease expires
+    write_handoff("week", SHARD_INDEX, unfinished + flaky_indices[flaky_done:] + retry_indices[retried:] + dead_indices[dead_tried:],
+                  "session lost" if auth_lost else "time budget")
+log(f"📤 Saved {flusher.rows_saved} rows in {flusher.flushes} writes | Backpressure stalls {flusher.stalls} ({flusher.stall_seconds:.1f}s)")
 
-restart_driver()
+history.save()
+# With runner.py the open browsers are handed to the next job instead of quit
+if spare: spare.close(driver)
+else: restart_driver()
+log(f"♻️ Duplicate chart loads avoided: {dup_loads_avoided}")
+if len(accounts.accounts) > 1: log(f"👥 Page loads per account: {accounts.summary()}")
+if prefetcher:
+    log(f"⏩ Prefetch hits {prefetcher.hits} | misses {prefetcher.misses} | head start {prefetcher.saved_seconds:.0f}s")
+    metrics.inc("prefetch_hits", prefetcher.hits)
+    metrics.inc("prefetch_misses", prefetcher.misses)
+log_stats(open_client("credentials.json"))
+metrics.write()
+if auth_lost:
+    log(f"🛑 Shard aborted, TradingView session lost: {auth_lost}. Refresh the cookies and re-run.")
+    sys.exit(1)
 log("🏁 WEEK SHARD COMPLETED.")
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import runpy
+from driver_pool import keep_browsers, close_parked
+
+# Runs several scraper jobs in one process, so Python startup, chromedriver
+# resolution, Chrome launch and Sheets auth are paid once: browsers left open
+# by a job are handed to the next job or slice with the same browser options,
+# and every job uses the same pooled Sheets client. Each job gets its own env;
+# a job that finishes its range clears its checkpoint, so the next run starts
+# over (rows it didn't get to are in its hand-off).
+#   python runner.py day week group clean              back to back
+#   python runner.py --interleave week group clean     week/group alternate in slices of
+#                                                      INTERLEAVE_ROWS rows, then clean
+#   python runner.py --config jobs.json [--interleave]
+# jobs.json: [{"job": "day", "env": {"OUTPUT_SHEET": "MV2 DAY", "STOCKLIST_COLS": "1,4"}}, ...]
+
+INTERLEAVE_ROWS = int(os.getenv("INTERLEAVE_ROWS", "25"))
+MAX_SLICES = 1000  # safety stop for a job that never reports its end
+REPO = os.path.dirname(os.path.abspath(__file__))
+# Kept across jobs: parked browsers (and the CDPDriver class they may be), the
+# Sheets client pool. Their env settings (HOT_SPARE, SHEETS_*, CHROME_BIN) are
+# process-wide; every other module is re-imported so it reads the job's env.
+SHARED_MODULES = ("driver_pool", "sheets_client", "cdp_driver")
+
+# done(globals) says whether a sliced job has reached the end of its rows
+JOBS = {
+    "day": {"script": "run_scraper.py",
+            "done": lambda g: bool(g.get("work_queue")) or g["loop_end"] >= min(g["END_ROW"], len(g["company_list"]))},
+    "week": {"script": "run_scraper1.py",
+             "done": lambda g: bool(g.get("work_queue")) or g["loop_end"] >= min(g["END_ROW"], len(g["company_list"]))},
+    "group": {"script": "test.py",
+              "done": lambda g: bool(g.get("work_queue")) or g["row_end"] >= g["total_rows"]},
+    "clean": {"script": "cleaner.py", "done": None},  # works off the status column, not row slices
+}
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def forget_modules():
+    # Repo modules read their config from the env at import; dropping them makes the next job re-import them
+    for mod_name, mod in list(sys.modules.items()):
+        path = getattr(mod, "__file__", None)
+        if (path and mod_name not in SHARED_MODULES and mod_name not in ("__main__", __name__)
+                and os.path.dirname(os.path.abspath(path)) == REPO):
+            del sys.modules[mod_name]
+
+def clear_checkpoint(name, g):
+    path = g.get("checkpoint_file") if g else None
+    if path and os.path.exists(path):
+        os.remove(path)
+        log(f"🧹 Job {name} finished, checkpoint {path} cleared for the next run")
+
+def run_job(name, env, extra=None):
+    # Runs one job script in this process with its env applied; returns (globals or None, ok)
+    script = os.path.join(REPO, JOBS[name]["script"])
+    overrides = {**env, **(extra or {})}
+    saved = {k: os.environ.get(k) for k in overrides}
+    os.environ.update({k: str(v) for k, v in overrides.items()})
+    forget_modules()
+    t0 = time.time()
+    try:
+        return runpy.run_path(script, run_name="__main__"), True
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+        if not ok:
+            log(f"🛑 Job {name} exited with code {e.code}")
+        return None, ok
+    except Exception as e:
+        log(f"🛑 Job {name} failed: {str(e)[:200]}")
+        return None, False
+    finally:
+        log(f"⏱️ Job {name} took {time.time() - t0:.0f}s")
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+def run_sequential(jobs, results):
+    for name, env in jobs:
+        log(f"▶️ Job {name}")
+        g, ok = run_job(name, env)
+        if ok:
+            clear_checkpoint(name, g)
+        results.append((name, ok))
+
+def run_interleaved(jobs, results):
+    # Sliced jobs take turns on INTERLEAVE_ROWS rows each; the rest run afterwards
+    active = [(name, env) for name, env in jobs if JOBS[name]["done"]]
+    rest = [(name, env) for name, env in jobs if not JOBS[name]["done"]]
+    slices = {name: 0 for name, _ in active}
+    while active:
+        for name, env in list(active):
+            slices[name] += 1
+            log(f"▶️ Job {name} slice {slices[name]} ({INTERLEAVE_ROWS} rows)")
+            g, ok = run_job(name, env, {"ROW_LIMIT": INTERLEAVE_ROWS, "METRICS_SUFFIX": f"_part{slices[name]}"})
+            # a job out of time budget has handed off its remaining rows
+            if not ok or g is None or JOBS[name]["done"](g) or g["budget"].stopped or slices[name] >= MAX_SLICES:
+                active.remove((name, env))
+                if ok:
+                    clear_checkpoint(name, g)
+                results.append((name, ok))
+    run_sequential(rest, results)
+
+def parse_args(argv):
+    interleave = "--interleave" in argv
+    argv = [a for a in argv if a != "--interleave"]
+    if argv[:1] == ["--config"]:
+        with open(argv[1], "r", encoding="utf-8") as f:
+            jobs = [(j["job"], j.get("env", {})) for j in json.load(f)]
+    else:
+        jobs = [(name, {}) for name in argv]
+    unknown = [name for name, _ in jobs if name not in JOBS]
+    if not jobs or unknown:
+        print(f"usage: python runner.py [--interleave] {{{'|'.join(JOBS)}}}... | --config jobs.json")
+        sys.exit(1)
+    return jobs, interleave
+
+if __name__ == "__main__":
+    jobs, interleave = parse_args(sys.argv[1:])
+    if interleave and os.getenv("WORK_QUEUE"):
+        log("⚠️ Work queue jobs claim their own rows, running back to back instead of interleaved")
+        interleave = False
+
+    os.environ.setdefault("RUNNER_STARTED", str(time.time()))  # JOB_BUDGET counts from here for every job
+    keep_browsers(True)
+    results = []
+    t0 = time.time()
+    try:
+        (run_interleaved if interleave else run_sequential)(jobs, results)
+    finally:
+        close_parked()
+    log(f"🏁 {len(results)} jobs in {time.time() - t0:.0f}s | " + ", ".join(f"{n}={'OK' if ok else 'FAILED'}" for n, ok in results))
+    sys.exit(0 if all(ok for _, ok in results) else 1)
@@ -0,0 +1,165 @@
+import os
+import gzip
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+# Shared Google Sheets client.
+# One keep-alive session per credentials file with an explicitly sized
+# connection pool, gzip on responses (and on larger request bodies), the
+# access token refreshed in the background before it expires, and per-call
+# timing and byte counts. open_client() hands back a normal gspread.Client.
+
+SHEETS_POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", "8"))
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "60"))
+SHEETS_GZIP_MIN_BYTES = int(os.getenv("SHEETS_GZIP_MIN_BYTES", "2048"))  # 0 disables request compression
+TOKEN_REFRESH_MARGIN = 300  # refresh when the token has less than this many seconds left
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def call_name(method, url):
+    # ".../values:batchUpdate" -> "values_batchUpdate", ".../values/Sheet1!A1" -> "values_get"
+    path = urlparse(url).path.rstrip("/")
+    last = path.rsplit("/", 1)[-1]
+    if "/values/" in path:
+        return f"values_{method.lower()}"  # A1 ranges contain ":" too
+    if ":" in last:
+        prefix, op = last.split(":", 1)
+        return f"values_{op}" if prefix == "values" else op
+    return f"{last if last in ('spreadsheets', 'files') else 'spreadsheet'}_{method.lower()}"
+
+def _session_class():
+    # google-auth and requests come with gspread; imported lazily like other optional pieces
+    from google.auth.transport.requests import AuthorizedSession, Request
+    from requests.adapters import HTTPAdapter
+
+    class SheetsSession(AuthorizedSession):
+        def __init__(self, credentials, pool_size=SHEETS_POOL_SIZE, metrics=None):
+            super().__init__(credentials)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.mount("https://", adapter)
+            # Google only gzips responses for clients that say so in the User-Agent too
+            self.headers["Accept-Encoding"] = "gzip"
+            self.headers["User-Agent"] = f"{self.headers.get('User-Agent', 'python-requests')} (gzip)"
+            self.metrics = metrics
+            self.gzip_requests = SHEETS_GZIP_MIN_BYTES > 0
+            self.stats = {}
+            self._stats_lock = threading.Lock()
+            self._refresh_lock = threading.Lock()
+            self._refreshing = False
+            self._token_request = Request()
+
+        # ---- token ---- #
+        def _refresh_token(self):
+            try:
+                self.credentials.refresh(self._token_request)
+            except Exception as e:
+                log(f"⚠️ Sheets token refresh failed: {str(e)[:80]}")
+            finally:
+                self._refreshing = False
+
+        def _keep_token_fresh(self):
+            creds = self.credentials
+            if not creds.token or creds.expiry is None:
+                with self._refresh_lock:
+                    if not creds.token:
+                        self._refreshing = True
+                        self._refresh_token()
+                return
+            # google-auth keeps expiry as naive UTC
+            left = (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+            if left < TOKEN_REFRESH_MARGIN:
+                with self._refresh_lock:
+                    if self._refreshing:
+                        return
+                    self._refreshing = True
+                if left <= 0:
+                    self._refresh_token()
+                else:
+                    # still valid: refresh off the request path
+                    threading.Thread(target=self._refresh_token, name="sheets-token", daemon=True).start()
+
+        # ---- requests ---- #
+        def request(self, method, url, data=None, headers=None, json=None, timeout=None, **kwargs):
+            if kwargs.get("_credential_refresh_attempt"):
+                # AuthorizedSession re-sending after a 401: body and headers are already prepared
+                # (maybe gzipped) and the outer call records the timing
+                return super().request(method, url, data=data, headers=headers, json=json, timeout=timeout, **kwargs)
+            self._keep_token_fresh()
+            headers = dict(headers or {})
+            if json is not None:
+                data = _dumps(json)
+                headers.setdefault("Content-Type", "application/json")
+            raw = data
+            if self.gzip_requests and "Content-Encoding" not in headers \
+                    and isinstance(data, bytes) and len(data) >= SHEETS_GZIP_MIN_BYTES:
+                data = gzip.compress(data)
+                headers["Content-Encoding"] = "gzip"
+
+            t0 = time.time()
+            resp = super().request(method, url, data=data, headers=headers, timeout=timeout or SHEETS_TIMEOUT, **kwargs)
+            if headers.get("Content-Encoding") == "gzip" and _refused_gzip(resp):
+                log("⚠️ Sheets API refused a gzip request body, sending uncompressed from now on")
+                self.gzip_requests = False
+                headers.pop("Content-Encoding")
+                data = raw
+                resp = super().request(method, url, data=data, headers=headers, timeout=timeout or SHEETS_TIMEOUT, **kwargs)
+            self._record(call_name(method, url), time.time() - t0,
+                         len(data) if isinstance(data, (bytes, str)) else 0,
+                         int(resp.headers.get("Content-Length") or len(resp.content)))
+            return resp
+
+        def _record(self, name, seconds, sent, received):
+            with self._stats_lock:
+                s = self.stats.setdefault(name, {"calls": 0, "seconds": 0.0, "max": 0.0, "sent": 0, "received": 0})
+                s["calls"] += 1
+                s["seconds"] += seconds
+                s["max"] = max(s["max"], seconds)
+                s["sent"] += sent
+                s["received"] += received
+            if self.metrics:
+                self.metrics.observe(f"sheets_{name.lower()}", seconds)
+                self.metrics.inc("sheets_bytes_sent", sent)
+                self.metrics.inc("sheets_bytes_received", received)
+
+    return SheetsSession
+
+def _refused_gzip(resp):
+    # 415, or a 400 that blames the encoding; any other 400 is a bad request and is returned as is
+    if resp.status_code == 415:
+        return True
+    return resp.status_code == 400 and any(w in resp.text.lower() for w in ("gzip", "content-encoding", "compress"))
+
+def _dumps(body):
+    return json.dumps(body, separators=(",", ":")).encode("utf-8")
+
+def open_client(credentials_file="credentials.json", metrics=None):
+    # One client (and connection pool) per credentials file for the whole process
+    with _clients_lock:
+        client = _clients.get(credentials_file)
+        if client is None:
+            import gspread
+            from google.oauth2.service_account import Credentials
+            creds = Credentials.from_service_account_file(credentials_file, scopes=gspread.auth.DEFAULT_SCOPES)
+            session = _session_class()(creds, metrics=metrics)
+            client = gspread.Client(auth=creds, session=session)
+            client.sheets_session = session
+            _clients[credentials_file] = client
+        elif metrics is not None:
+            client.sheets_session.metrics = metrics
+        return client
+
+def log_stats(client):
+    session = getattr(client, "sheets_session", None)
+    if not session or not session.stats:
+        return
+    for name, s in sorted(session.stats.items()):
+        log(f"📶 Sheets {name:<14} {s['calls']:>4} calls | avg {s['seconds'] * 1000 / s['calls']:6.0f}ms | "
+            f"max {s['max'] * 1000:6.0f}ms | sent {s['sent'] / 1024:7.1f}KB | received {s['received'] / 1024:7.1f}KB")
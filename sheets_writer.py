@@ -0,0 +1,185 @@
+import time
+import queue
+import random
+import threading
+
+# Background Sheets writer.
+# Scraped rows go into a bounded queue drained by a writer thread that batches
+# them by size or age and retries on its own, so the browser never waits on a
+# network write. put() only blocks when the queue is full (backpressure).
+# A batch that keeps failing is written row by row: rows the API rejects as a
+# bad request (invalid range, beyond the grid) are dropped with a log, the rest
+# are saved or kept for the next batch, so one bad row can't block every write.
+
+QUOTA_BACKOFF = 60
+MAX_ATTEMPTS = 5
+
+_FLUSH = object()
+_STOP = object()
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+class BackgroundFlusher:
+    def __init__(self, sheet, batch_updates=300, max_age=30, max_queue=200,
+                 value_input_option="RAW", prepare=None, on_error=None, metrics=None):
+        self.sheet = sheet
+        self.batch_updates = batch_updates
+        self.max_age = max_age
+        self.value_input_option = value_input_option
+        self.prepare = prepare        # payload -> payload, applied before each upload
+        self.on_error = on_error      # called with the error text, e.g. to resize the grid
+        self.metrics = metrics
+
+        self._q = queue.Queue(maxsize=max_queue)
+        self._pending = []
+        self._pending_rows = 0
+        self._rows = []               # (updates, on_saved) per row, for row-by-row writes
+        self._oldest = None
+
+        self.rows_saved = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+        self._thread.start()
+
+    # ---- producer side ---- #
+    def put(self, updates, on_saved=None):
+        # on_saved runs once these updates are uploaded
+        item = (updates, on_saved)
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            log("⏸️ Write queue full, waiting for the writer...")
+            t0 = time.time()
+            self._q.put(item)
+            self.stalls += 1
+            self.stall_seconds += time.time() - t0
+            if self.metrics:
+                self.metrics.inc("writer_stalls")
+                self.metrics.observe("writer_stall", time.time() - t0)
+
+    def flush(self):
+        self._q.put(_FLUSH)
+
+    def close(self):
+        # Flushes what is left; returns True when nothing is left unsaved
+        self._q.put(_STOP)
+        self._thread.join()
+        return not self._pending
+
+    @property
+    def backlog_rows(self):
+        return self._q.qsize() + self._pending_rows
+
+    # ---- writer thread ---- #
+    def _run(self):
+        stop = False
+        while not stop:
+            timeout = self.max_age
+            if self._oldest is not None:
+                timeout = max(0.1, self.max_age - (time.time() - self._oldest))
+            try:
+                item = self._q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            force = item is _FLUSH or item is _STOP
+            stop = item is _STOP
+            if item is not None and not force:
+                updates, on_saved = item
+                self._pending.extend(updates)
+                self._pending_rows += 1
+                self._rows.append(item)
+                if self._oldest is None:
+                    self._oldest = time.time()
+
+            if self._pending and (force or len(self._pending) >= self.batch_updates
+                                  or time.time() - self._oldest >= self.max_age):
+                self._flush()
+
+    def _write(self, updates):
+        payload = self.prepare(updates) if self.prepare else updates
+        if self.value_input_option:
+            self.sheet.batch_update(payload, value_input_option=self.value_input_option)
+        else:
+            self.sheet.batch_update(payload)
+        return payload
+
+    def _saved(self, rows):
+        for _, on_saved in rows:
+            if on_saved:
+                try:
+                    on_saved()
+                except Exception as e:
+                    log(f"⚠️ Post-save callback failed: {str(e)[:80]}")
+
+    def _keep(self, rows):
+        self._rows = rows
+        self._pending = [u for updates, _ in rows for u in updates]
+        self._pending_rows = len(rows)
+        self._oldest = time.time() if rows else None
+
+    def _flush(self):
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                t0 = time.time()
+                payload = self._write(self._pending)
+                self.flushes += 1
+                self.rows_saved += self._pending_rows
+                if self.metrics:
+                    self.metrics.inc("flushes")
+                    self.metrics.observe("flush", time.time() - t0)
+                log(f"🚀 Saved {self._pending_rows} rows ({len(payload)} updates) in {time.time() - t0:.1f}s | Queue={self._q.qsize()}")
+                self._saved(self._rows)
+                self._keep([])
+                return True
+            except Exception as e:
+                msg = str(e)
+                if self.metrics:
+                    self.metrics.inc("flush_errors")
+                    if "429" in msg:
+                        self.metrics.inc("quota_hits")
+                if self.on_error:
+                    try:
+                        self.on_error(msg)
+                    except Exception as ee:
+                        log(f"⚠️ Write error handler failed: {str(ee)[:80]}")
+                wait = QUOTA_BACKOFF if "429" in msg else (2 ** attempt) + random.random()
+                log(f"⚠️ Write failed (attempt {attempt + 1}/{MAX_ATTEMPTS}): {msg[:100]}. Retrying in {wait:.1f}s...")
+                time.sleep(wait)
+        self.failed_flushes += 1
+        log(f"🛑 Write failed after {MAX_ATTEMPTS} attempts, writing its {self._pending_rows} rows one by one")
+        return self._isolate()
+
+    def _isolate(self):
+        # One write per row: bad requests are dropped, other failures stay for the next batch
+        kept = []
+        for row in self._rows:
+            try:
+                self._write(row[0])
+            except Exception as e:
+                if not _bad_request(e):
+                    kept.append(row)
+                    continue
+                self.rows_dropped += 1
+                if self.metrics:
+                    self.metrics.inc("rows_dropped")
+                log(f"🗑️ Dropped a row the Sheets API rejects: {str(e)[:100]}")
+                continue
+            self.rows_saved += 1
+            self._saved([row])
+        if kept:
+            log(f"🛑 {len(kept)} rows kept for the next batch")
+        self._keep(kept)
+        return not kept
+
+def _bad_request(e):
+    # gspread's APIError carries the response; a 400 won't succeed on a retry
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return status == 400 or "[400]" in str(e)
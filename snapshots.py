@@ -0,0 +1,116 @@
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import time
+from extractors import css_values, group_values, group_xpath_present, WEEK_VALUE_SELECTOR
+
+# Record-and-replay of rendered chart pages.
+# Recording (SNAPSHOT_DIR set): every SNAPSHOT_EVERY-th scraped page is saved
+# with the values the live extractor returned. Replay runs every extractor
+# against the saved pages offline, checks the values and times each one:
+#   python snapshots.py replay [dir] [repeat]
+# Selenium's .text skips hidden elements and reflows whitespace, which an HTML
+# parser can't reproduce, so day/week pages also record the elements'
+# textContent (what the parser sees) and replay checks against that.
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+SNAPSHOT_EVERY = int(os.getenv("SNAPSHOT_EVERY", "25"))
+
+DOM_TEXTS_JS = "return Array.from(document.querySelectorAll(arguments[0])).map(e => e.textContent);"
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def normalize(values):
+    # Whitespace-insensitive form of extracted values, applied to both sides of a replay check
+    return [" ".join(v.split()) for v in values]
+
+def dom_texts(drv, selector):
+    # textContent of the matching elements, stripped and non-empty like css_values
+    texts = [" ".join((t or "").split()) for t in drv.execute_script(DOM_TEXTS_JS, selector) or []]
+    return [t for t in texts if t]
+
+# ---------------- RECORD ---------------- #
+class Recorder:
+    def __init__(self, out_dir=SNAPSHOT_DIR, every=SNAPSHOT_EVERY):
+        self.out_dir = out_dir
+        self.every = max(every, 1)
+        self.seen = 0
+        self.saved = 0
+
+    def maybe_record(self, url, html, values, extractor, dom_values=None):
+        # html and dom_values may be callables, so they are only fetched for sampled rows
+        if not self.out_dir or not url:
+            return
+        self.seen += 1
+        if (self.seen - 1) % self.every:
+            return
+        try:
+            if callable(html):
+                html = html()
+            if callable(dom_values):
+                dom_values = dom_values()
+            os.makedirs(self.out_dir, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", url.split("://", 1)[-1])[-60:]
+            path = os.path.join(self.out_dir, f"{int(time.time())}_{self.seen}_{slug}.json.gz")
+            snap = {"url": url, "extractor": extractor, "values": list(values),
+                    "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"), "html": html}
+            if dom_values is not None:
+                snap["dom_values"] = list(dom_values)
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                json.dump(snap, f)
+            self.saved += 1
+            log(f"📸 Snapshot saved -> {path}")
+        except Exception as e:
+            log(f"⚠️ Snapshot failed: {str(e)[:80]}")
+
+# ---------------- REPLAY ---------------- #
+EXTRACTORS = {
+    "day_css": css_values,
+    "week_css": lambda html: css_values(html, WEEK_VALUE_SELECTOR),
+    "group_class": group_values,
+    "group_xpath": group_xpath_present,
+}
+
+def load_snapshots(snap_dir):
+    for path in sorted(glob.glob(os.path.join(snap_dir, "*.json.gz"))):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            yield path, json.load(f)
+
+def replay(snap_dir, repeat=3):
+    timings = {name: [] for name in EXTRACTORS}
+    checked = mismatches = 0
+
+    for path, snap in load_snapshots(snap_dir):
+        for name, extractor in EXTRACTORS.items():
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                result = extractor(snap["html"])
+            timings[name].append((time.perf_counter() - t0) * 1000 / repeat)
+
+            if name == "group_xpath":
+                if result is False and snap["extractor"] == "group_class":
+                    mismatches += 1
+                    log(f"❌ {os.path.basename(path)} | group XPath no longer matches")
+            elif name == snap["extractor"]:
+                checked += 1
+                expected = snap.get("dom_values", snap["values"])
+                if normalize(result) != normalize(expected):
+                    mismatches += 1
+                    log(f"❌ {os.path.basename(path)} | {name} got {len(result)} values, recorded {len(expected)}")
+
+    log(f"📊 Replayed {len(timings['day_css'])} snapshots | Checked {checked} | Mismatches {mismatches}")
+    for name, samples in timings.items():
+        if samples:
+            log(f"   ⏱️ {name:<12} avg {sum(samples) / len(samples):7.2f}ms | max {max(samples):7.2f}ms")
+    return mismatches
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        snap_dir = sys.argv[2] if len(sys.argv) > 2 else (SNAPSHOT_DIR or "snapshots")
+        sys.exit(1 if replay(snap_dir, int(sys.argv[3]) if len(sys.argv) > 3 else 3) else 0)
+    print("usage: python snapshots.py replay [dir] [repeat]")
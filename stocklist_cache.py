@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+
+# Local snapshot of stocklist columns shared by all shards.
+# Columns are fetched with one batch_get per sheet (instead of one col_values
+# call per column per shard), stored gzipped with the fetch time and the
+# spreadsheet's last-update time, and reused until STOCKLIST_TTL expires.
+# When stale, an unchanged spreadsheet only costs a metadata lookup.
+#   python stocklist_cache.py "<spreadsheet>" "<worksheet>" <col> [<col> ...]   (prefetch)
+
+STOCKLIST_CACHE_DIR = os.getenv("STOCKLIST_CACHE_DIR", "stocklist_cache")
+STOCKLIST_TTL = int(os.getenv("STOCKLIST_TTL", "3600"))
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+def col_num_to_letter(n):
+    result = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        result = chr(65 + rem) + result
+    return result
+
+def cache_path(worksheet, cols):
+    key = f"{worksheet.spreadsheet.title}_{worksheet.title}_{'-'.join(map(str, cols))}"
+    return os.path.join(STOCKLIST_CACHE_DIR, re.sub(r"[^A-Za-z0-9_-]+", "_", key) + ".json.gz")
+
+def source_revision(worksheet):
+    # Drive modifiedTime; empty if unavailable so staleness falls back to TTL only
+    try:
+        return worksheet.spreadsheet.lastUpdateTime or ""
+    except Exception:
+        return ""
+
+def read_cache(path):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def write_cache(path, snap):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(snap, f)
+    os.replace(tmp, path)
+
+def fetch_columns(worksheet, cols):
+    ranges = [f"{col_num_to_letter(c)}:{col_num_to_letter(c)}" for c in cols]
+    result = worksheet.batch_get(ranges, major_dimension="COLUMNS")
+    return [(vr[0] if vr else []) for vr in result]
+
+def load_columns(worksheet, cols, ttl=STOCKLIST_TTL):
+    path = cache_path(worksheet, cols)
+    snap = read_cache(path)
+    if snap and time.time() - snap["fetched_at"] < ttl:
+        log(f"📦 Stocklist cache hit ({os.path.basename(path)}, age {time.time() - snap['fetched_at']:.0f}s)")
+        return snap["columns"]
+
+    revision = source_revision(worksheet)
+    if snap and revision and revision == snap.get("revision"):
+        log(f"📦 Stocklist unchanged since {revision}, reusing cache")
+        snap["fetched_at"] = time.time()
+    else:
+        log(f"📥 Fetching stocklist columns {cols} in one call...")
+        snap = {"columns": fetch_columns(worksheet, cols), "fetched_at": time.time(), "revision": revision}
+    try:
+        write_cache(path, snap)
+    except Exception as e:
+        log(f"⚠️ Stocklist cache write failed: {str(e)[:80]}")
+    return snap["columns"]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print('usage: python stocklist_cache.py "<spreadsheet>" "<worksheet>" <col> [<col> ...]')
+        sys.exit(1)
+    from sheets_client import open_client
+    ws = open_client("credentials.json").open(sys.argv[1]).worksheet(sys.argv[2])
+    columns = load_columns(ws, [int(c) for c in sys.argv[3:]], ttl=0)
+    log(f"✅ Cached {len(columns)} columns ({max(len(c) for c in columns)} rows) -> {cache_path(ws, [int(c) for c in sys.argv[3:]])}")
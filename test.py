@@ -1,18 +1,23 @@
 import sys
 import os
 import time
-import json
 from datetime import date
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
-from bs4 import BeautifulSoup
-import gspread
-from webdriver_manager.chrome import ChromeDriverManager
+from work_queue import open_work_queue
+from timeouts import LatencyHistory, DEAD_URL_TIMEOUT, FLAKY_SCHEDULE, FLAKY_WAIT_FACTOR, FLAKY_RESTART_EVERY
+from driver_pool import HotSpare, HOT_SPARE, chromedriver_path
+from extractors import GROUP_XPATH, group_values
+from snapshots import Recorder
+from stocklist_cache import load_columns
+from sheets_writer import BackgroundFlusher
+from metrics import Metrics
+from sheets_client import open_client, log_stats
+from accounts import AccountPool, pool_paths, COOKIE_POOL
+from deadline import Budget, stop_on_sigterm, read_handoff, write_handoff
+from page_state import wait_for_chart, classify_exception, AuthGuard, AuthLost, OK, NAV_TIMEOUT
 
 def log(msg):
     print(msg, flush=True)
@@ -22,12 +27,19 @@ def log(msg):
 # =========================
 SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
 SHARD_STEP  = int(os.getenv("SHARD_STEP", "1"))
+ROW_LIMIT   = int(os.getenv("ROW_LIMIT", "0"))  # runner.py: rows per slice, the next slice resumes from the checkpoint
+
+STOCKLIST_SHEET = os.getenv("STOCKLIST_SHEET", "Stock List")
+STOCKLIST_TAB = os.getenv("STOCKLIST_TAB", "Sheet1")
+STOCKLIST_COLS = [int(c) for c in os.getenv("STOCKLIST_COLS", "1,3,4").split(",")]  # name, C link, D link
+OUTPUT_SHEET = os.getenv("OUTPUT_SHEET", "MV2 for SQL")
+OUTPUT_TAB = os.getenv("OUTPUT_TAB", "Sheet16")
 
 checkpoint_file = os.getenv("CHECKPOINT_FILE", f"checkpoint_{SHARD_INDEX}.txt")
 last_i = int(open(checkpoint_file).read()) if os.path.exists(checkpoint_file) else 0
 
 # ✅ Resolve chromedriver path ONCE (fast restarts)
-CHROME_DRIVER_PATH = ChromeDriverManager().install()
+CHROME_DRIVER_PATH = chromedriver_path()
 
 # ✅ Batch size (buffer) = 50 updates (as you asked)
 BATCH_SIZE_UPDATES = 50
@@ -35,6 +47,14 @@ BATCH_SIZE_UPDATES = 50
 # ✅ Small optimizations (no main logic change)
 CHECKPOINT_EVERY = 10   # write checkpoint every N processed rows
 ROW_SLEEP = 0.05
+WAIT_TIMEOUT = 45       # ceiling; per-URL waits are learned from latency history
+
+history = LatencyHistory()
+recorder = Recorder()
+metrics = Metrics("group", SHARD_INDEX)
+# Stops taking rows in time to save everything when JOB_BUDGET / DEADLINE is set
+budget = Budget(metrics)
+stop_on_sigterm()
 
 # =========================
 # HELPERS: CLEAN + LAST 3
@@ -88,83 +108,130 @@ def create_driver():
     driver.set_page_load_timeout(40)
 
     # ---- COOKIE LOGIC ----
-    if os.path.exists("cookies.json"):
+    if accounts:
         try:
-            driver.get("https://in.tradingview.com/")
-            time.sleep(2)
-            with open("cookies.json", "r") as f:
-                cookies = json.load(f)
-
-            for c in cookies:
-                try:
-                    driver.add_cookie({
-                        k: v for k, v in c.items()
-                        if k in ("name", "value", "path", "secure", "expiry")
-                    })
-                except:
-                    continue
-
-            driver.refresh()
-            time.sleep(1)
+            apply_cookies(driver)
             log("✅ Cookies applied successfully")
         except Exception as e:
             log(f"⚠️ Cookie error: {str(e)[:120]}")
 
     return driver
 
+# One cookie file per account (COOKIE_POOL), falling back to cookies.json
+accounts = AccountPool(pool_paths(COOKIE_POOL, "cookies.json"), offset=SHARD_INDEX)
+
+def apply_cookies(driver):
+    # Binds the driver to an account (a new one if its account was dropped) and loads its cookies
+    account = accounts.assign(driver)
+    if account is None:
+        return
+    driver.get("https://in.tradingview.com/")
+    time.sleep(2)
+    driver.delete_all_cookies()
+
+    for c in account.cookies():
+        try:
+            driver.add_cookie(c)
+        except:
+            continue
+
+    driver.refresh()
+    time.sleep(1)
+
+# Logged-out/blocked pages get one cookie re-auth, then another account; the shard aborts when none is left
+auth = AuthGuard(apply_cookies, metrics=metrics, accounts=accounts)
+
+# Standby browser warmed in the background so a RESTART swaps instantly
+spare = HotSpare(create_driver, ["selenium", "eager", "page_load_timeout=40"]) if HOT_SPARE else None
+
+def fresh_driver(old=None):
+    if old:
+        metrics.inc("restarts")
+    if spare:
+        spare.retire(old)
+        drv = spare.take()
+        if accounts and not accounts.usable(drv):
+            # standby was warmed with an account that has since been dropped
+            try: apply_cookies(drv)
+            except: pass
+        return drv
+    if old:
+        try: old.quit()
+        except: pass
+    return create_driver()
+
 # =========================
 # SCRAPER LOGIC (UNCHANGED MAIN XPATH)
 # =========================
-def scrape_tradingview(driver, url):
+def scrape_tradingview(driver, url, timeout=None):
+    if timeout is None:
+        timeout = history.timeout_for(url, WAIT_TIMEOUT)
     try:
+        accounts.pace(driver)
+        t0 = time.time()
         driver.get(url)
-        WebDriverWait(driver, 45).until(
-            EC.visibility_of_element_located((
-                By.XPATH,
-                '/html/body/div[2]/div/div[5]/div/div[1]/div/div[2]/div[1]/div[2]/div/div[1]/div[2]/div[2]/div[2]/div[2]/div'
-            ))
-        )
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        values = [
-            el.get_text().replace('−', '-').replace('∅', 'None')
-            for el in soup.find_all("div", class_="valueValue-l31H9iuA apply-common-tooltip")
-        ]
+        t_wait = time.time()
+        state = wait_for_chart(driver, GROUP_XPATH, timeout, xpath=True)
+        if state != OK:
+            log(f"   🚫 {state.replace('_', ' ')} after {time.time() - t0:.0f}s")
+            if state == NAV_TIMEOUT:
+                history.record(url, 0, False)
+            # "NO_SESSION" = still logged out after the re-auth, not worth a refresh
+            return [] if auth.on_failure(driver, state) or state == NAV_TIMEOUT else "NO_SESSION"
+        auth.ok()
+        history.record(url, time.time() - t_wait, True)
+        metrics.observe("page_load", time.time() - t0)
+        html = driver.page_source
+        values = group_values(html)
+        recorder.maybe_record(url, html, values, "group_class")
         return values
-    except (TimeoutException, NoSuchElementException):
+    except (TimeoutException, NoSuchElementException) as e:
+        history.record(url, 0, False)
+        metrics.inc("scrape_failures")
+        auth.on_failure(driver, classify_exception(e))
         return []
-    except WebDriverException:
+    except WebDriverException as e:
+        metrics.inc("scrape_failures")
+        auth.on_failure(driver, classify_exception(e))
         log("🛑 Browser Crash Detected")
         return "RESTART"
 
-def scrape_with_retry(driver, url, label=""):
+def scrape_with_retry(driver, url, label="", timeout=None):
     if label:
         log(f"   🌐 {label} visiting...")
     else:
         log("   🌐 visiting...")
 
-    values = scrape_tradingview(driver, url)
+    # Known-dead URLs get one short attempt instead of two full waits
+    if history.is_dead(url):
+        log(f"   🪦 {label} known-dead URL, single {DEAD_URL_TIMEOUT:.0f}s attempt")
+        values = scrape_tradingview(driver, url, timeout=DEAD_URL_TIMEOUT)
+        return [] if values == "NO_SESSION" else values
+
+    values = scrape_tradingview(driver, url, timeout)
+    if values == "NO_SESSION":
+        return []
     if values == []:
         log(f"   ⚠️ {label} got empty values, refreshing once...")
+        metrics.inc("retries")
         try:
             driver.refresh()
             time.sleep(0.7)
         except:
             pass
-        values = scrape_tradingview(driver, url)
-    return values
+        values = scrape_tradingview(driver, url, timeout)
+    return [] if values == "NO_SESSION" else values
 
 # =========================
 # SHEETS SETUP
 # =========================
 log("📊 Connecting to Google Sheets...")
 try:
-    gc = gspread.service_account("credentials.json")
-    sheet_main = gc.open("Stock List").worksheet("Sheet1")
-    sheet_data = gc.open("MV2 for SQL").worksheet("Sheet16")
+    gc = open_client("credentials.json", metrics=metrics)
+    sheet_main = gc.open(STOCKLIST_SHEET).worksheet(STOCKLIST_TAB)
+    sheet_data = gc.open(OUTPUT_SHEET).worksheet(OUTPUT_TAB)
 
-    name_list = sheet_main.col_values(1)
-    url_list_c = sheet_main.col_values(3)
-    url_list_d = sheet_main.col_values(4)
+    name_list, url_list_c, url_list_d = load_columns(sheet_main, STOCKLIST_COLS)
 
     total_rows = max(len(name_list), len(url_list_c), len(url_list_d))
     log(f"✅ Setup complete | Shard {SHARD_INDEX}/{SHARD_STEP} | Resume index {last_i} | Total {total_rows}")
@@ -172,7 +239,7 @@ try:
     # prevent grid limit crashes
     needed_rows = total_rows + 10
     if sheet_data.row_count < needed_rows:
-        log(f"🧱 Resizing Sheet16 rows: {sheet_data.row_count} -> {needed_rows}")
+        log(f"🧱 Resizing {OUTPUT_TAB} rows: {sheet_data.row_count} -> {needed_rows}")
         sheet_data.resize(rows=needed_rows)
 
 except Exception as e:
@@ -182,14 +249,11 @@ except Exception as e:
 # =========================
 # BUFFER + FLUSH
 # =========================
-driver = create_driver()
-batch_list = []
+driver = fresh_driver()
 
 current_date = date.today().strftime("%m/%d/%Y")
 
-rows_buffered = 0
 total_rows_processed = 0
-total_flushes = 0
 _last_checkpoint_written = last_i
 
 def _clean_ranges(updates):
@@ -202,46 +266,19 @@ def _clean_ranges(updates):
         cleaned.append({"range": r, "values": u.get("values", [[]])})
     return cleaned
 
-def flush_batch(reason=""):
-    global batch_list, rows_buffered, total_flushes
-    if not batch_list:
-        log("📭 Flush skipped (buffer empty)")
-        return
-
-    log(f"🚚 FLUSH START {('('+reason+')') if reason else ''} | Updates={len(batch_list)} | RowsBuffered={rows_buffered}")
-
-    backoffs = [2, 5, 15]
-    for attempt in range(1, 4):
+def _on_flush_error(msg):
+    # runs on the writer thread before it backs off (60s on 429)
+    if "exceeds grid limits" in msg.lower():
         try:
-            payload = _clean_ranges(batch_list)
-            sheet_data.batch_update(payload)
-
-            total_flushes += 1
-            log(f"🚀 FLUSH OK | Saved {len(payload)} updates | RowsBuffered={rows_buffered} | FlushCount={total_flushes}")
+            new_rows = max(sheet_data.row_count + 800, total_rows + 10)
+            log(f"🧱 Auto-resize on grid limit: {sheet_data.row_count} -> {new_rows}")
+            sheet_data.resize(rows=new_rows)
+        except Exception as ee:
+            log(f"⚠️ Resize failed: {str(ee)[:150]}")
 
-            batch_list = []
-            rows_buffered = 0
-            return
-
-        except Exception as e:
-            msg = str(e)
-            log(f"⚠️ FLUSH ERROR (attempt {attempt}/3): {msg[:220]}")
-
-            if "exceeds grid limits" in msg.lower():
-                try:
-                    new_rows = max(sheet_data.row_count + 800, total_rows + 10)
-                    log(f"🧱 Auto-resize on grid limit: {sheet_data.row_count} -> {new_rows}")
-                    sheet_data.resize(rows=new_rows)
-                except Exception as ee:
-                    log(f"⚠️ Resize failed: {str(ee)[:150]}")
-
-            if "429" in msg:
-                log("⏳ Quota hit, sleeping 60s...")
-                time.sleep(60)
-            else:
-                time.sleep(backoffs[attempt - 1])
-
-    log("🛑 FLUSH FAILED after 3 attempts (buffer retained, will retry later)")
+# Uploads run on a background thread so the browser never waits on a write
+flusher = BackgroundFlusher(sheet_data, batch_updates=BATCH_SIZE_UPDATES, value_input_option=None,
+                            prepare=_clean_ranges, on_error=_on_flush_error, metrics=metrics)
 
 def maybe_checkpoint(i_plus_1, force=False):
     global _last_checkpoint_written
@@ -255,22 +292,68 @@ def maybe_checkpoint(i_plus_1, force=False):
             log(f"⚠️ CHECKPOINT write failed: {str(e)[:120]}")
 
 def log_buffer_state(extra=""):
-    updates = len(batch_list)
-    remaining = max(BATCH_SIZE_UPDATES - updates, 0)
-    msg = (f"📦 BUFFER STATE | Updates={updates}/{BATCH_SIZE_UPDATES} | "
-           f"RowsBuffered={rows_buffered} | RemainingToFlush={remaining}")
+    msg = (f"📦 WRITER STATE | RowsUnsaved={flusher.backlog_rows} | RowsSaved={flusher.rows_saved} | "
+           f"FlushCount={flusher.flushes}")
     if extra:
         msg += f" | {extra}"
     log(msg)
 
+# Shared lease table (WORK_QUEUE) replaces the fixed modulo sharding when configured
+work_queue = open_work_queue("group")
+handoff_first = set()
+if work_queue:
+    log(f"📋 Claiming row blocks from work queue ({work_queue.job})")
+    row_iter = work_queue.rows(0, total_rows)
+else:
+    row_end = min(total_rows, last_i + ROW_LIMIT) if ROW_LIMIT else total_rows
+    # Rows an earlier run ran out of time for go first; they don't move the checkpoint
+    handoff_first = {r for r in read_handoff("group", SHARD_INDEX)[0] if r < total_rows}
+    range_rows = [r for r in range(last_i, row_end) if r not in handoff_first]
+
+def shard_rows(rows):
+    return [r for r in rows if r % SHARD_STEP == SHARD_INDEX]
+
+def row_is_flaky(i):
+    # either link keeps missing on the first try (latency history)
+    return any(history.is_flaky(u) for u in (safe_get(url_list_c, i), safe_get(url_list_d, i)) if u.startswith("http"))
+
+# Flaky rows go last, together on fresh sessions with longer waits; the checkpoint stops at the first one not yet done
+flaky_rows = set()
+if not work_queue:
+    if FLAKY_SCHEDULE:
+        flaky_rows = {r for r in shard_rows(range_rows) if row_is_flaky(r)}
+        metrics.inc("flaky_deferred", len(flaky_rows))
+    row_iter = sorted(handoff_first) + [r for r in range_rows if r not in flaky_rows] + sorted(flaky_rows)
+flaky_seen = 0
+flaky_pending = set(flaky_rows)  # the checkpoint can't pass these until they are scraped
+reached = last_i                 # end of the non-flaky rows done so far
+
+auth_lost = None
+slice_done = False
+unfinished = []  # rows not started (budget / lost session), handed off at the end
+pos = 0
 try:
-    for i in range(last_i, total_rows):
+    for pos, i in enumerate(row_iter):
 
         # sharding
-        if i % SHARD_STEP != SHARD_INDEX:
+        if not work_queue and i % SHARD_STEP != SHARD_INDEX:
             continue
 
+        if not budget.allows():
+            if not work_queue:
+                unfinished = shard_rows(row_iter[pos:])
+            break
+
+        if i in flaky_rows:
+            if flaky_seen % FLAKY_RESTART_EVERY == 0:
+                if not flaky_seen:
+                    log(f"🌪️ {len(flaky_rows)} flaky rows on fresh sessions ({FLAKY_WAIT_FACTOR:.1f}x waits)...")
+                driver = fresh_driver(driver)
+            flaky_seen += 1
+
         total_rows_processed += 1
+        row_t0 = time.time()
+        row_timeout = WAIT_TIMEOUT * FLAKY_WAIT_FACTOR if i in flaky_rows else None
 
         name = safe_get(name_list, i) or f"Row {i+1}"
         url_c = safe_get(url_list_c, i)
@@ -280,7 +363,7 @@ try:
         # safety: ensure row exists
         if target_row > sheet_data.row_count:
             grow_to = target_row + 300
-            log(f"🧱 Growing Sheet16 for row {target_row}: {sheet_data.row_count} -> {grow_to}")
+            log(f"🧱 Growing {OUTPUT_TAB} for row {target_row}: {sheet_data.row_count} -> {grow_to}")
             sheet_data.resize(rows=grow_to)
 
         log("")
@@ -291,13 +374,11 @@ try:
         # ---- Scrape C ----
         values_c = []
         if url_c.startswith("http"):
-            values_c = scrape_with_retry(driver, url_c, label="C link")
+            values_c = scrape_with_retry(driver, url_c, label="C link", timeout=row_timeout)
             if values_c == "RESTART":
                 log("🧯 RESTART needed (during C). Rebuilding browser...")
-                try: driver.quit()
-                except: pass
-                driver = create_driver()
-                values_c = scrape_with_retry(driver, url_c, label="C link (after restart)")
+                driver = fresh_driver(driver)
+                values_c = scrape_with_retry(driver, url_c, label="C link (after restart)", timeout=row_timeout)
                 if values_c == "RESTART":
                     log("🛑 C still failing after restart, treating as empty.")
                     values_c = []
@@ -307,19 +388,21 @@ try:
         # ---- Scrape D ----
         values_d = []
         if url_d.startswith("http"):
-            values_d = scrape_with_retry(driver, url_d, label="D link")
+            values_d = scrape_with_retry(driver, url_d, label="D link", timeout=row_timeout)
             if values_d == "RESTART":
                 log("🧯 RESTART needed (during D). Rebuilding browser...")
-                try: driver.quit()
-                except: pass
-                driver = create_driver()
-                values_d = scrape_with_retry(driver, url_d, label="D link (after restart)")
+                driver = fresh_driver(driver)
+                values_d = scrape_with_retry(driver, url_d, label="D link (after restart)", timeout=row_timeout)
                 if values_d == "RESTART":
                     log("🛑 D still failing after restart, treating as empty.")
                     values_d = []
         else:
             log("   ⏭️ D link invalid/blank -> skipped")
 
+        for url, values in ((url_c, values_c), (url_d, values_d)):
+            if url.startswith("http"):
+                history.note_first_try(url, isinstance(values, list) and len(values) >= 3)
+
         # ---- Combine: ONLY last 3 of C + last 3 of D, and remove whitespace ----
         c_last3 = last_three(values_c if isinstance(values_c, list) else [])
         d_last3 = last_three(values_d if isinstance(values_d, list) else [])
@@ -327,41 +410,81 @@ try:
 
         log(f"📌 SCRAPE RESULT | C={len(values_c) if isinstance(values_c, list) else 0} | D={len(values_d) if isinstance(values_d, list) else 0} | Combined={len(combined_values)}")
 
-        # ---- Buffer updates ----
-        batch_list.append({"range": f"A{target_row}", "values": [[name]]})
-        batch_list.append({"range": f"J{target_row}", "values": [[current_date]]})
+        # ---- Queue updates for the writer ----
+        row_updates = [
+            {"range": f"A{target_row}", "values": [[name]]},
+            {"range": f"J{target_row}", "values": [[current_date]]},
+        ]
 
         if combined_values:
-            batch_list.append({"range": f"K{target_row}", "values": [combined_values]})
-            log(f"📝 BUFFER APPEND | A{target_row}, J{target_row}, K{target_row}.. | AddedUpdates=3")
+            row_updates.append({"range": f"K{target_row}", "values": [combined_values]})
+            log(f"📝 QUEUED | A{target_row}, J{target_row}, K{target_row}.. | AddedUpdates=3")
         else:
-            log(f"📝 BUFFER APPEND | A{target_row}, J{target_row} | AddedUpdates=2 (no combined values)")
+            log(f"📝 QUEUED | A{target_row}, J{target_row} | AddedUpdates=2 (no combined values)")
 
-        rows_buffered += 1
+        flusher.put(row_updates, on_saved=work_queue.on_saved(i) if work_queue else None)
+        metrics.inc("rows")
+        metrics.inc("rows_ok" if len(combined_values) == 6 else "rows_not_ok")
+        metrics.observe("row", time.time() - row_t0)
+        budget.row_done(time.time() - row_t0)
         log_buffer_state(extra=f"After row {target_row}")
 
-        # flush when buffer full
-        if len(batch_list) >= BATCH_SIZE_UPDATES:
-            flush_batch(reason="BATCH_SIZE reached")
-            log_buffer_state(extra="After flush")
-
         # checkpoint
-        maybe_checkpoint(i + 1, force=False)
-
-        log(f"✅ ROW END | ProcessedInThisRun={total_rows_processed} | FlushCount={total_flushes}")
+        if not work_queue and i not in handoff_first:
+            flaky_pending.discard(i)
+            if i not in flaky_rows:
+                reached = i + 1
+            maybe_checkpoint(min([reached] + list(flaky_pending)), force=False)
+        if not work_queue:
+            budget.report((len(row_iter) - pos - 1) // SHARD_STEP)
+        if total_rows_processed % CHECKPOINT_EVERY == 0:
+            history.save()
+
+        log(f"✅ ROW END | ProcessedInThisRun={total_rows_processed} | FlushCount={flusher.flushes}")
         log("====================================================")
 
         if ROW_SLEEP:
             time.sleep(ROW_SLEEP)
+    slice_done = not budget.stopped
 
+except AuthLost as e:
+    auth_lost = e
+    if not work_queue:
+        unfinished = shard_rows(row_iter[pos:])
 finally:
-    flush_batch(reason="finalize")
+    saved = flusher.close()
+    if not saved:
+        log(f"🛑 FINAL FLUSH FAILED | {flusher.backlog_rows} rows not saved")
     log_buffer_state(extra="After final flush")
-    maybe_checkpoint(_last_checkpoint_written, force=True)
+    if ROW_LIMIT and saved and slice_done and not work_queue:
+        # the whole slice is saved, so the next one starts right after it
+        maybe_checkpoint(row_end, force=True)
+    else:
+        maybe_checkpoint(_last_checkpoint_written, force=True)
+    if not work_queue:
+        if not slice_done and not unfinished:
+            unfinished = shard_rows(row_iter[pos:])  # crashed or interrupted mid-row
+        # Work queue rows left undone go back to the pool when their lease expires
+        write_handoff("group", SHARD_INDEX, unfinished,
+                      "session lost" if auth_lost else "time budget" if budget.stopped else "interrupted")
+    history.save()
+
+    # With runner.py the open browsers are handed to the next job instead of quit
+    if spare:
+        spare.close(driver)
+    else:
+        try:
+            driver.quit()
+        except:
+            pass
+    if len(accounts.accounts) > 1:
+        log(f"👥 Page loads per account: {accounts.summary()}")
+    log_stats(open_client("credentials.json"))
+    metrics.write()
 
-    try:
-        driver.quit()
-    except:
-        pass
+    log(f"🏁 DONE | TotalProcessed={total_rows_processed} | TotalFlushes={flusher.flushes} | "
+        f"WriterStalls={flusher.stalls} ({flusher.stall_seconds:.1f}s)")
 
-    log(f"🏁 DONE | TotalProcessed={total_rows_processed} | TotalFlushes={total_flushes}")
+if auth_lost:
+    log(f"🛑 Shard aborted, TradingView session lost: {auth_lost}. Refresh the cookies and re-run.")
+    sys.exit(1)
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+from datetime import date
+
+# Per-URL latency history used to size waits, plus a negative cache of URLs
+# that failed several runs in a row and the first-try outcomes of recent runs
+# (flaky URLs are scheduled after the reliable ones). Persisted as JSON between runs:
+#   {url: {"lat": [seconds, ...], "fail_runs": n, "last_fail_run": "YYYY-MM-DD", "first": [1, 0, ...]}}
+# "lat" is the wait for the values once the page load has returned, the part the
+# learned timeout bounds; the load itself keeps the driver's page-load timeout.
+
+# ---------------- CONFIG ---------------- #
+HISTORY_FILE = os.getenv("LATENCY_HISTORY_FILE", "latency_history.json")
+TIMEOUT_FACTOR = float(os.getenv("TIMEOUT_FACTOR", "2.0"))
+TIMEOUT_FLOOR = float(os.getenv("TIMEOUT_FLOOR", "6"))
+DEAD_AFTER_RUNS = int(os.getenv("DEAD_AFTER_RUNS", "3"))
+DEAD_URL_TIMEOUT = float(os.getenv("DEAD_URL_TIMEOUT", "5"))
+FLAKY_SCHEDULE = os.getenv("FLAKY_SCHEDULE", "1") == "1"
+FLAKY_RATIO = float(os.getenv("FLAKY_RATIO", "0.34"))            # share of recent runs that missed on the first try
+FLAKY_WAIT_FACTOR = float(os.getenv("FLAKY_WAIT_FACTOR", "1.5"))  # longer waits for the flaky batch
+FLAKY_RESTART_EVERY = int(os.getenv("FLAKY_RESTART_EVERY", "5"))  # fresh session every N flaky rows
+FIRST_TRY_RUNS = 10
+MAX_SAMPLES = 20
+RUN_ID = os.getenv("RUN_ID", date.today().isoformat())
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+class LatencyHistory:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except Exception:
+                self.data = {}
+
+    def timeout_for(self, url, ceiling):
+        # p95 x factor, clamped to [floor, ceiling]; unknown URLs get the old fixed wait
+        samples = self.data.get(url, {}).get("lat", [])
+        if not samples:
+            return ceiling
+        return max(TIMEOUT_FLOOR, min(ceiling, percentile(samples, 0.95) * TIMEOUT_FACTOR))
+
+    def record(self, url, seconds, ok):
+        if not url:
+            return
+        entry = self.data.setdefault(url, {"lat": [], "fail_runs": 0, "last_fail_run": ""})
+        if ok:
+            entry["lat"] = (entry["lat"] + [round(seconds, 2)])[-MAX_SAMPLES:]
+            entry["fail_runs"] = 0
+            entry["last_fail_run"] = ""
+        elif entry["last_fail_run"] != RUN_ID:
+            # Count failing runs, not failing attempts
+            entry["fail_runs"] += 1
+            entry["last_fail_run"] = RUN_ID
+
+    def note_first_try(self, url, ok):
+        # Whether the first pass got the row, once per run; the retry pass doesn't count
+        if not url:
+            return
+        entry = self.data.setdefault(url, {"lat": [], "fail_runs": 0, "last_fail_run": ""})
+        entry["first"] = (entry.get("first", []) + [1 if ok else 0])[-FIRST_TRY_RUNS:]
+
+    def is_flaky(self, url):
+        # Missed on the first try in at least FLAKY_RATIO of the recent runs (two runs minimum)
+        first = self.data.get(url, {}).get("first", []) if url else []
+        return len(first) >= 2 and first.count(0) / len(first) >= FLAKY_RATIO
+
+    def is_dead(self, url):
+        return bool(url) and self.data.get(url, {}).get("fail_runs", 0) >= DEAD_AFTER_RUNS
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"[{time.strftime('%H:%M:%S')}] ⚠️ Latency history save failed: {str(e)[:80]}", flush=True)
@@ -0,0 +1,30 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# URL normalisation and a URL -> rows index, so stocklist rows that point at
+# the same chart (aliases, duplicate listings) only pay for one page load.
+
+TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "ref", "ref_src", "aff_id", "share_your_love"}
+QUOTE_CHARS = "\"'“”‘’` \t\r\n"
+
+def normalize_url(url):
+    if not url:
+        return ""
+    url = url.strip().strip(QUOTE_CHARS)
+    parts = urlsplit(url)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    kept = [(k, v) for k, v in params if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")]
+    # Only re-encode the query when something was dropped, so symbols like NSE:X stay as written
+    query = urlencode(kept, safe=":/,") if len(kept) != len(params) else parts.query
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+def build_url_index(indices, url_for):
+    # {normalised url: [row indices]} in first-seen order; url_for(i) returns the raw URL or None
+    index = {}
+    for i in indices:
+        url = normalize_url(url_for(i))
+        if url:
+            index.setdefault(url, []).append(i)
+    return index
+
+def duplicate_count(index):
+    return sum(len(rows) - 1 for rows in index.values())
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import threading
+import urllib.request
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Dynamic row distribution for shards.
+# Workers claim small row blocks from a shared lease table instead of owning a
+# fixed range, so fast workers keep pulling blocks while slow ones finish theirs.
+# A lease that is not renewed before LEASE_TTL expires goes back to the pool.
+#
+#   WORK_QUEUE=sqlite:leases.db          same-host workers (SQLite locking)
+#   WORK_QUEUE=http://127.0.0.1:8765     stand-in queue service (python work_queue.py serve)
+#   WORK_QUEUE_RUN=<id>                  names the run's queue (defaults to GITHUB_RUN_ID)
+
+# ---------------- CONFIG ---------------- #
+WORK_QUEUE = os.getenv("WORK_QUEUE", "")
+BLOCK_SIZE = int(os.getenv("BLOCK_SIZE", "10"))
+LEASE_TTL = int(os.getenv("LEASE_TTL", "600"))
+CLAIM_RETRIES = int(os.getenv("CLAIM_RETRIES", "5"))  # backoff 2, 4, 8, 16, 32s before the worker gives up
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+# Workers of one run share a queue; a new run (even the same day) starts a fresh one
+WORK_QUEUE_RUN = os.getenv("WORK_QUEUE_RUN") or os.getenv("GITHUB_RUN_ID", "")
+
+def log(msg):
+    t = time.strftime("%H:%M:%S")
+    print(f"[{t}] {msg}", flush=True)
+
+# ---------------- BACKENDS ---------------- #
+class SQLiteLeaseTable:
+    def __init__(self, path):
+        self.path = path
+        with closing(self._conn()) as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS leases (
+                job TEXT, start INTEGER, end INTEGER, status TEXT DEFAULT 'pending',
+                worker TEXT, expires REAL DEFAULT 0, PRIMARY KEY (job, start))""")
+
+    def _conn(self):
+        # One short-lived connection per call keeps this safe across threads/processes
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def seed(self, job, start, end, block_size):
+        with closing(self._conn()) as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO leases (job, start, end) VALUES (?, ?, ?)",
+                [(job, s, min(s + block_size, end)) for s in range(start, end, block_size)])
+
+    def claim(self, job, worker, ttl):
+        db = self._conn()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = db.execute(
+                "SELECT start, end FROM leases WHERE job = ? AND "
+                "(status = 'pending' OR (status = 'leased' AND expires < ?)) ORDER BY start LIMIT 1",
+                (job, now)).fetchone()
+            if row:
+                db.execute("UPDATE leases SET status = 'leased', worker = ?, expires = ? WHERE job = ? AND start = ?",
+                           (worker, now + ttl, job, row[0]))
+            db.execute("COMMIT")
+            return list(row) if row else None
+        finally:
+            db.close()
+
+    def renew(self, job, worker, start, ttl):
+        with closing(self._conn()) as db:
+            cur = db.execute("UPDATE leases SET expires = ? WHERE job = ? AND start = ? AND worker = ? AND status = 'leased'",
+                             (time.time() + ttl, job, start, worker))
+            return cur.rowcount == 1
+
+    def complete(self, job, worker, start):
+        with closing(self._conn()) as db:
+            db.execute("UPDATE leases SET status = 'done' WHERE job = ? AND start = ? AND worker = ?",
+                       (job, start, worker))
+
+    def stats(self, job):
+        with closing(self._conn()) as db:
+            return dict(db.execute("SELECT status, COUNT(*) FROM leases WHERE job = ? GROUP BY status", (job,)).fetchall())
+
+class HTTPLeaseTable:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def _call(self, op, **params):
+        req = urllib.request.Request(f"{self.base_url}/{op}", data=json.dumps(params).encode(),
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=30) as r:
+            return json.load(r)
+
+    def seed(self, job, start, end, block_size):
+        return self._call("seed", job=job, start=start, end=end, block_size=block_size)
+
+    def claim(self, job, worker, ttl):
+        return self._call("claim", job=job, worker=worker, ttl=ttl)
+
+    def renew(self, job, worker, start, ttl):
+        return self._call("renew", job=job, worker=worker, start=start, ttl=ttl)
+
+    def complete(self, job, worker, start):
+        return self._call("complete", job=job, worker=worker, start=start)
+
+    def stats(self, job):
+        return self._call("stats", job=job)
+
+def open_lease_table(spec):
+    if spec.startswith("http://") or spec.startswith("https://"):
+        return HTTPLeaseTable(spec)
+    return SQLiteLeaseTable(spec.split(":", 1)[1] if spec.startswith("sqlite:") else spec)
+
+# ---------------- WORKER SIDE ---------------- #
+class WorkQueue:
+    def __init__(self, table, job, worker=WORKER_ID):
+        self.table = table
+        self.job = job
+        self.worker = worker
+        self._open = {}               # block start -> rows not written yet
+        self._lock = threading.Lock()  # rows are reported from the writer thread
+        self.blocks_claimed = 0
+
+    def _with_retry(self, what, op, *args):
+        # Lease table calls that a worker can't go on without: retried with backoff, re-raised at the end
+        for attempt in range(CLAIM_RETRIES + 1):
+            try:
+                return op(*args)
+            except Exception as e:
+                if attempt == CLAIM_RETRIES:
+                    raise
+                wait = 2 ** (attempt + 1)
+                log(f"⚠️ Lease {what} failed: {str(e)[:80]}. Retrying in {wait}s...")
+                time.sleep(wait)
+
+    def rows(self, start, end):
+        # Yields row indices block by block; a block is done once all its rows are written (on_saved)
+        try:
+            self._with_retry("seed", self.table.seed, self.job, start, end, BLOCK_SIZE)
+        except Exception as e:
+            log(f"❌ Lease table unreachable, worker stops: {str(e)[:80]}")
+            return
+        while True:
+            try:
+                block = self._with_retry("claim", self.table.claim, self.job, self.worker, LEASE_TTL)
+            except Exception as e:
+                log(f"❌ Lease claim gave up after {CLAIM_RETRIES} retries, worker stops: {str(e)[:80]}")
+                return
+            if not block:
+                return
+            self.blocks_claimed += 1
+            log(f"📥 Claimed rows {block[0] + 1}-{block[1]} ({self.worker})")
+            with self._lock:
+                self._open[block[0]] = set(range(block[0], block[1]))
+            for i in range(block[0], block[1]):
+                yield i
+                if block[0] in self._open:  # not already completed by the writer
+                    self.renew(block[0])
+
+    def renew(self, start):
+        # A missed renewal only risks the block expiring and being scraped twice, so keep going
+        try:
+            if not self.table.renew(self.job, self.worker, start, LEASE_TTL):
+                log(f"⚠️ Lease for block {start} was lost (expired and reclaimed?)")
+        except Exception as e:
+            log(f"⚠️ Lease renew failed for block {start}: {str(e)[:80]}")
+
+    def complete(self, start):
+        try:
+            self.table.complete(self.job, self.worker, start)
+        except Exception as e:
+            log(f"⚠️ Lease complete failed for block {start}: {str(e)[:80]}")
+
+    def written(self, i):
+        # Row i is uploaded; its block completes with its last row. Rows deferred to a later
+        # pass keep the block open, so if the worker dies first the lease expires and
+        # another worker picks the block up again.
+        with self._lock:
+            start = next((s for s, left in self._open.items() if i in left), None)
+            if start is None:
+                return
+            self._open[start].discard(i)
+            if self._open[start]:
+                return
+            del self._open[start]
+        self.complete(start)
+
+    def on_saved(self, i):
+        # Callback for a background writer
+        return lambda: self.written(i)
+
+def open_work_queue(job_name):
+    if not WORK_QUEUE:
+        return None
+    if not WORK_QUEUE_RUN:
+        log("⚠️ WORK_QUEUE needs WORK_QUEUE_RUN (or GITHUB_RUN_ID) shared by the run's workers, using the fixed shard range")
+        return None
+    return WorkQueue(open_lease_table(WORK_QUEUE), f"{job_name}-{WORK_QUEUE_RUN}")
+
+# ---------------- STAND-IN SERVICE ---------------- #
+def serve(db_path, port):
+    table = SQLiteLeaseTable(db_path)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            op = self.path.strip("/")
+            params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if op not in ("seed", "claim", "renew", "complete", "stats"):
+                self.send_error(404)
+                return
+            body = json.dumps(getattr(table, op)(**params)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    log(f"🗄️ Lease service on :{port} (db: {db_path})")
+    ThreadingHTTPServer(("0.0.0.0", port), Handler).serve_forever()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2] if len(sys.argv) > 2 else "leases.db", int(sys.argv[3]) if len(sys.argv) > 3 else 8765)
+    elif len(sys.argv) > 2 and sys.argv[1] == "stats":
+        print(json.dumps(open_lease_table(WORK_QUEUE or "leases.db").stats(sys.argv[2]), indent=2))
+    else:
+        print("usage: python work_queue.py serve [db_path] [port] | stats <job>")